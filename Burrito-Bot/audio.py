@@ -0,0 +1,154 @@
+import os
+import math
+import asyncio
+import threading
+import discord
+
+# Cada paquete Opus que se envía a Discord son 20 ms de audio
+FRAME_SECONDS = 0.02
+
+# Segundos antes de matar el ffmpeg anterior tras un reinicio, para que el
+# hilo de audio termine la lectura que tenga en curso
+CLEANUP_DELAY = 0.5
+
+# ffmpeg reintenta por su cuenta los cortes breves de la conexión HTTP
+RECONNECT_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5'
+
+# Si ffmpeg termina antes de tiempo, la canción se reanuda en la misma
+# posición hasta STREAM_RESUME_RETRIES veces. Un final a menos de
+# RESUME_MARGIN segundos de la duración se considera el final normal.
+STREAM_RESUME_RETRIES = int(os.getenv('STREAM_RESUME_RETRIES', '3'))
+RESUME_MARGIN = 5
+
+# Tras este tiempo sonando sin cortes se vuelven a permitir todos los
+# reintentos (cuentan los cortes seguidos, no los de toda la canción)
+RESUME_STABLE_SECONDS = 30
+
+
+class TrackSource(discord.FFmpegOpusAudio):
+    # Fuente Opus generada directamente por ffmpeg. Si el formato ya es Opus
+    # y el volumen es 100% se copia el audio sin decodificar ni recodificar;
+    # en otro caso el volumen se aplica con un filtro de ffmpeg y ffmpeg
+    # codifica a Opus, sin pasar muestras PCM por Python.
+
+    # Procesos ffmpeg vivos, para las métricas
+    active = 0
+    _active_lock = threading.Lock()
+
+    def __init__(self,
+                 track,
+                 volume=1.0,
+                 offset=0.0,
+                 executable=None,
+                 on_start=None):
+        self.track = track
+        self.volume = volume
+        self.offset = offset
+        self.executable = executable or 'ffmpeg'
+        self.frames = 0
+        # Se llama desde el hilo de audio al enviar el primer paquete
+        self.on_start = on_start
+        self._cleaned = False
+        # ffmpeg dejó de entregar audio (fin del stream o error)
+        self.exhausted = False
+        self.passthrough = track.codec == 'opus' and volume == 1.0
+        before_options = []
+        if track.stream_url.startswith(('http://', 'https://')):
+            before_options.append(RECONNECT_OPTIONS)
+        if offset:
+            before_options.append(f'-ss {offset:.2f}')
+        options = '-vn'
+        if not self.passthrough:
+            options += f' -filter:a volume={volume:.2f}'
+        super().__init__(track.stream_url,
+                         # 'opus' hace que discord.py use '-c:a copy'
+                         codec='opus' if self.passthrough else None,
+                         executable=self.executable,
+                         before_options=' '.join(before_options) or None,
+                         options=options)
+        with TrackSource._active_lock:
+            TrackSource.active += 1
+
+    def read(self):
+        data = super().read()
+        if data:
+            self.frames += 1
+            if self.frames == 1 and self.on_start:
+                self.on_start()
+        else:
+            self.exhausted = True
+        return data
+
+    def cleanup(self):
+        super().cleanup()
+        with TrackSource._active_lock:
+            if not self._cleaned:
+                self._cleaned = True
+                TrackSource.active -= 1
+
+    @property
+    def position(self):
+        return self.offset + self.frames * FRAME_SECONDS
+
+    def interrupted(self, error=None):
+        # True si la reproducción acabó por un corte y no por llegar al final
+        # ni por un stop() (-skip, desconexión...)
+        if not (error or self.exhausted):
+            return False
+        duration = self.track.duration
+        return bool(duration) and self.position < duration - RESUME_MARGIN
+
+    @property
+    def stable(self):
+        return self.frames * FRAME_SECONDS >= RESUME_STABLE_SECONDS
+
+
+def format_time(seconds):
+    seconds = int(seconds)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
+
+
+def parse_time(text):
+    # Acepta segundos ("95") o "m:ss" / "h:mm:ss"; ValueError si no es válido
+    parts = text.strip().split(':')
+    if len(parts) > 3:
+        raise ValueError(text)
+    seconds = 0.0
+    for part in parts:
+        value = float(part)
+        if value < 0 or not math.isfinite(value):
+            raise ValueError(text)
+        seconds = seconds * 60 + value
+    return seconds
+
+
+def current_position(voice_client):
+    # Posición en segundos de la canción actual según los paquetes enviados:
+    # no avanza mientras está en pausa y se conserva tras un reinicio
+    source = voice_client.source if voice_client else None
+    return source.position if isinstance(source, TrackSource) else None
+
+
+def restart_source(voice_client, offset=None, volume=None, track=None):
+    # Sustituye el ffmpeg de la canción actual por otro con nuevo volumen
+    # y/o posición, sin disparar el 'after' de la reproducción. Se reutiliza
+    # la URL ya resuelta salvo que se pase otro 'track'
+    old = voice_client.source
+    if not isinstance(old, TrackSource):
+        return None
+    new = TrackSource(track or old.track,
+                      volume=old.volume if volume is None else volume,
+                      offset=old.position if offset is None else offset,
+                      executable=old.executable)
+    was_paused = voice_client.is_paused()
+    voice_client.source = new
+    if was_paused:
+        # Cambiar la fuente reanuda el reproductor
+        voice_client.pause()
+    loop = asyncio.get_running_loop()
+    loop.call_later(CLEANUP_DELAY, loop.run_in_executor, None, old.cleanup)
+    return new
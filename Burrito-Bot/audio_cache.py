@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+import yt_dlp as youtube_dl
+from cache import LRU
+
+# Caché local de audio (desactivada si no se define AUDIO_CACHE_DIR)
+AUDIO_CACHE_DIR = os.getenv('AUDIO_CACHE_DIR')
+AUDIO_CACHE_MAX_BYTES = int(
+    os.getenv('AUDIO_CACHE_MAX_BYTES', str(2 * 1024 * 1024 * 1024)))
+AUDIO_CACHE_MIN_PLAYS = int(os.getenv('AUDIO_CACHE_MIN_PLAYS', '3'))
+
+INDEX_FILE = 'index.json'
+
+# Se prefiere Opus en WebM para poder reproducirlo sin recodificar
+DOWNLOAD_OPTS = {
+    'format': 'bestaudio[acodec=opus]/bestaudio/best',
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,
+}
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AudioCache:
+    # Guarda en disco, en su contenedor original, el audio de las canciones
+    # que se han reproducido al menos 'min_plays' veces. El índice es un LRU
+    # limitado por bytes; los ficheros se escriben con nombre temporal y se
+    # renombran al terminar, y se comprueba su checksum al arrancar.
+
+    def __init__(self,
+                 directory=AUDIO_CACHE_DIR,
+                 max_bytes=AUDIO_CACHE_MAX_BYTES,
+                 min_plays=AUDIO_CACHE_MIN_PLAYS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self.index = OrderedDict()  # video_id -> {file, size, sha256, codec}
+        self.plays = LRU(10000)
+        self.downloading = set()
+        self.lock = threading.Lock()
+        # Una descarga puede guardar el índice mientras close() lo guarda
+        # también: las dos escriben el mismo .tmp
+        self.save_lock = threading.Lock()
+        # Un único hilo de descarga para no competir con la reproducción
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='audio-cache')
+        os.makedirs(directory, exist_ok=True)
+        # El índice se verifica en segundo plano, antes de cualquier descarga
+        self.executor.submit(self.load)
+
+    @property
+    def total_bytes(self):
+        return sum(item['size'] for item in self.index.values())
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self):
+        # Bloqueante: lee el índice y descarta ficheros ausentes o corruptos
+        for name in os.listdir(self.directory):
+            if name.startswith('.') and '.tmp.' in name:
+                # Restos de descargas interrumpidas
+                self._unlink(self._path(name))
+        try:
+            with open(self._path(INDEX_FILE)) as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            stored = {}
+        index = OrderedDict()
+        for video_id, item in stored.items():
+            path = self._path(item['file'])
+            try:
+                valid = file_checksum(path) == item['sha256']
+            except OSError:
+                valid = False
+            if valid:
+                index[video_id] = item
+            else:
+                logging.warning(f"Caché de audio: descartado {item['file']}")
+                self._unlink(path)
+        with self.lock:
+            self.index = index
+        self._save_index()
+
+    def _save_index(self):
+        with self.lock:
+            data = json.dumps(self.index)
+        tmp = self._path(INDEX_FILE + '.tmp')
+        with self.save_lock:
+            with open(tmp, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self._path(INDEX_FILE))
+
+    def _unlink(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def local_track(self, track):
+        # Devuelve el Track apuntando al fichero local, si existe
+        with self.lock:
+            item = self.index.get(track.id)
+            if item is None:
+                return None
+            self.index.move_to_end(track.id)
+        return replace(track,
+                       stream_url=self._path(item['file']),
+                       codec=item['codec'],
+                       expires_at=None)
+
+    def record_play(self, track):
+        plays = (self.plays.get(track.id) or 0) + 1
+        self.plays.put(track.id, plays)
+        with self.lock:
+            wanted = (plays >= self.min_plays and track.id not in self.index
+                      and track.id not in self.downloading)
+            if wanted:
+                self.downloading.add(track.id)
+        if wanted:
+            self.executor.submit(self._download, track)
+
+    def _download(self, track):
+        try:
+            opts = dict(DOWNLOAD_OPTS,
+                        outtmpl=self._path(f'.{track.id}.tmp.%(ext)s'))
+            with youtube_dl.YoutubeDL(opts) as ydl:
+                info = ydl.extract_info(track.webpage_url, download=True)
+                tmp = ydl.prepare_filename(info)
+            name = f"{track.id}.{info['ext']}"
+            size = os.path.getsize(tmp)
+            if size > self.max_bytes:
+                self._unlink(tmp)
+                return
+            checksum = file_checksum(tmp)
+            # Renombrado atómico: nunca queda un fichero a medias con el
+            # nombre definitivo
+            os.replace(tmp, self._path(name))
+            with self.lock:
+                self.index[track.id] = {
+                    'file': name,
+                    'size': size,
+                    'sha256': checksum,
+                    'codec': info.get('acodec'),
+                }
+                evicted = []
+                while self.total_bytes > self.max_bytes:
+                    _, item = self.index.popitem(last=False)
+                    evicted.append(item['file'])
+            for file in evicted:
+                self._unlink(self._path(file))
+            self._save_index()
+            logging.info(f"Caché de audio: guardado {name} ({size} bytes)")
+        except Exception as e:
+            logging.error(f"Caché de audio: error al descargar {track.id}: {e}")
+        finally:
+            with self.lock:
+                self.downloading.discard(track.id)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._save_index()
@@ -0,0 +1,165 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from resolver import ResolverBusy, ResolverTimeout
+from tracks import get_ydl, track_from_info, youtube_id
+
+# Canciones ya resueltas que se guardan para el autoplay de cada servidor
+AUTOPLAY_POOL_SIZE = int(os.getenv('AUTOPLAY_POOL_SIZE', '3'))
+
+# Canciones recientes que no se repiten y cuántas se usan como semilla
+AUTOPLAY_HISTORY = int(os.getenv('AUTOPLAY_HISTORY', '50'))
+AUTOPLAY_SEEDS = 3
+
+# Entradas que se miran de cada Mix de YouTube
+MIX_ENTRIES = 25
+
+
+def mix_url(video_id):
+    # El Mix ("RD" + id) de YouTube es la lista de relacionados del vídeo
+    return f"https://www.youtube.com/watch?v={video_id}&list=RD{video_id}"
+
+
+def youtube_related(video_id):
+    # Bloqueante: entradas planas del Mix del vídeo
+    info = get_ydl('mix').extract_info(mix_url(video_id), download=False)
+    entries = []
+    for entry in (info or {}).get('entries') or []:
+        if entry and entry.get('id'):
+            entries.append(track_from_info(entry, with_stream=False).to_entry())
+        if len(entries) >= MIX_ENTRIES:
+            break
+    return entries
+
+
+def spotify_related(spotify, title):
+    # Bloqueante: recomendaciones de Spotify sembradas con la canción que
+    # más se parece al título. Devuelve consultas para buscar en YouTube
+    results = spotify.search(q=title, limit=1)
+    items = results['tracks']['items']
+    if not items:
+        return []
+    recommended = spotify.recommendations(seed_tracks=[items[0]['id']],
+                                          limit=10)
+    return [
+        f"{track['name']} {track['artists'][0]['name']}"
+        for track in recommended['tracks']
+    ]
+
+
+class Recommender:
+    # Busca canciones relacionadas con una dada: primero el Mix de YouTube y,
+    # si no da nada, las recomendaciones de Spotify
+
+    def __init__(self, pool, tracks, spotify):
+        self.pool = pool
+        self.tracks = tracks
+        self.spotify = spotify
+
+    async def related(self, seed):
+        # seed: (video_id, título). Devuelve consultas o URLs a resolver
+        video_id, title = seed
+        try:
+            entries = await self.pool.run(youtube_related, video_id)
+            if entries:
+                return [entry['url'] for entry in entries]
+        except (ResolverBusy, ResolverTimeout):
+            raise
+        except Exception as e:
+            logging.warning(f"Autoplay: sin Mix de YouTube para {title}: {e}")
+        try:
+            return await self.pool.run(spotify_related, self.spotify, title)
+        except (ResolverBusy, ResolverTimeout):
+            raise
+        except Exception as e:
+            logging.warning(f"Autoplay: sin recomendaciones para {title}: {e}")
+            return []
+
+
+class AutoplayPool:
+    # Historial de un servidor y candidatas ya resueltas para el autoplay.
+    # Se rellena en segundo plano con canciones relacionadas con las últimas
+    # que han sonado, así play_next no espera a yt-dlp cuando se acaba la cola.
+
+    def __init__(self,
+                 recommender,
+                 size=AUTOPLAY_POOL_SIZE,
+                 history_size=AUTOPLAY_HISTORY):
+        self.recommender = recommender
+        self.size = size
+        self.history = deque(maxlen=history_size)  # (video_id, título)
+        self.candidates = deque()  # Track con el stream resuelto
+        self.task = None
+
+    def __len__(self):
+        return len(self.candidates)
+
+    def _known(self, video_id):
+        return any(seen == video_id for seen, _ in self.history) or any(
+            track.id == video_id for track in self.candidates)
+
+    def record(self, track):
+        if not track.id:
+            return
+        self.history.append((track.id, track.title))
+        # Si la canción ya estaba entre las candidatas, deja de serlo
+        self.candidates = deque(candidate for candidate in self.candidates
+                                if candidate.id != track.id)
+
+    def fill(self):
+        # Arranca el relleno en segundo plano si hace falta
+        if len(self.candidates) >= self.size or not self.history:
+            return
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._fill())
+
+    async def _fill(self):
+        seeds = list(self.history)[-AUTOPLAY_SEEDS:]
+        for seed in reversed(seeds):
+            try:
+                queries = await self.recommender.related(seed)
+            except (ResolverBusy, ResolverTimeout) as e:
+                logging.warning(f"Autoplay: resolver saturado: {e}")
+                return
+            for query in queries:
+                if len(self.candidates) >= self.size:
+                    return
+                video_id = youtube_id(query)
+                if video_id and self._known(video_id):
+                    # El propio vídeo semilla y los que ya han sonado
+                    continue
+                try:
+                    track = await self.recommender.tracks.resolve(query)
+                except (ResolverBusy, ResolverTimeout) as e:
+                    logging.warning(f"Autoplay: resolver saturado: {e}")
+                    return
+                if track is None or track.stream_url is None:
+                    continue
+                if not self._known(track.id):
+                    self.candidates.append(track)
+
+    def take(self):
+        # Primera candidata vigente, o None si no hay ninguna lista
+        while self.candidates:
+            track = self.candidates.popleft()
+            if not track.expired and not self._known(track.id):
+                self.fill()
+                return track
+        self.fill()
+        return None
+
+    async def next(self):
+        # Como take(), pero si el relleno está en marcha lo espera
+        track = self.take()
+        if track is None and self.task is not None:
+            # wait() no propaga errores ni la cancelación del relleno
+            await asyncio.wait([self.task])
+            track = self.take()
+        return track
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.candidates.clear()
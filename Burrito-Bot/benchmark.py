@@ -0,0 +1,612 @@
+import os
+import sys
+import gc
+import json
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+import itertools
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from urllib.parse import urlparse, parse_qs
+
+# Benchmark sin red: ejecuta los comandos reales de main.py (play,
+# play_next, queue, move, load_playlist) con un ctx y un cliente de voz
+# simulados y un yt-dlp/Spotify falsos con latencia configurable.
+#
+#   python benchmark.py --guilds 1,100,1000 --output bench_results.json
+
+# main.py lee la configuración al importarse: credenciales falsas, sin caché
+# persistente y playlists en una base de datos temporal
+_tmpdir = tempfile.mkdtemp(prefix='burrito-bench-')
+os.environ.setdefault('SPOTIPY_CLIENT_ID', 'bench')
+os.environ.setdefault('SPOTIPY_CLIENT_SECRET', 'bench')
+os.environ['PLAYLIST_DB_PATH'] = os.path.join(_tmpdir, 'playlists.db')
+os.environ.pop('CACHE_DB_PATH', None)
+os.environ.pop('AUDIO_CACHE_DIR', None)
+
+import discord
+import tracks as tracks_module
+from tracks import youtube_id
+from cache import TrackCache
+from resolver import SingleFlight
+from sources import HedgedSearch, build_sources
+from audio import FRAME_SECONDS
+import main
+
+DEFAULT_OUTPUT = 'bench_results.json'
+
+# Ids de servidor únicos entre escenarios, para que un play_next rezagado
+# no toque los reproductores del escenario siguiente
+_guild_ids = itertools.count(10**17)
+
+
+def percentile(samples, q):
+    # Percentil por rango más cercano
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'p50': percentile(samples, 50),
+        'p95': percentile(samples, 95),
+        'p99': percentile(samples, 99),
+        'max': max(samples) if samples else None,
+    }
+
+
+class Catalog:
+    # Canciones del backend falso; la popularidad sigue una ley de Zipf para
+    # que la caché y el single-flight se comporten como en producción
+
+    def __init__(self, size, seed):
+        self.rng = random.Random(seed)
+        self.songs = [(f"Artista {i % 50}", f"Canción {i}") for i in range(size)]
+        self.weights = [1 / (rank + 1) for rank in range(size)]
+        self.titles = {}
+        for artist, name in self.songs:
+            query = f"{name} {artist}"
+            self.titles[self.video_id(query)] = query
+
+    @staticmethod
+    def video_id(query):
+        return hashlib.md5(query.lower().encode()).hexdigest()[:11]
+
+    def pick(self):
+        return self.rng.choices(self.songs, self.weights)[0]
+
+    def query(self):
+        artist, name = self.pick()
+        return f"{name} {artist}"
+
+
+class FakeYDL:
+    # Sustituye a YoutubeDL: duerme la latencia configurada (en el hilo del
+    # resolver, como la extracción real) y devuelve metadatos sintéticos
+
+    def __init__(self, profile, catalog, latency):
+        self.profile = profile
+        self.catalog = catalog
+        self.latency = latency
+
+    def extract_info(self, target, download=False, process=True):
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        query = None
+        if target.startswith(('ytsearch1:', 'scsearch1:')):
+            query = target.split(':', 1)[1]
+        elif target.startswith('https://music.youtube.com/search'):
+            query = parse_qs(urlparse(target).query)['q'][0]
+        if query is not None:
+            return {'entries': [self._info(self.catalog.video_id(query), query)]}
+        video_id = youtube_id(target) or self.catalog.video_id(target)
+        return self._info(video_id, self.catalog.titles.get(video_id, target))
+
+    def _info(self, video_id, title):
+        info = {
+            'id': video_id,
+            'title': title,
+            'duration': 180 + int(video_id, 16) % 120,
+        }
+        url = f"https://www.youtube.com/watch?v={video_id}"
+        if self.profile == 'search':
+            info['url'] = url
+            return info
+        info.update(webpage_url=url,
+                    url=f"https://bench.invalid/{video_id}?expire="
+                    f"{int(time.time()) + 6 * 3600}",
+                    acodec='opus',
+                    abr=128,
+                    thumbnail=f"https://bench.invalid/{video_id}.jpg")
+        return info
+
+    def get_info_extractor(self, ie_key):
+        return None
+
+    def close(self):
+        pass
+
+
+class FakeSpotify:
+    # Endpoints de spotipy que usan main.py e importer.py
+
+    def __init__(self, catalog, latency, size):
+        self.catalog = catalog
+        self.latency = latency
+        self.size = size
+
+    def _wait(self):
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+
+    def _tracks(self, collection_id, offset, limit):
+        rng = random.Random(collection_id)
+        songs = [self.catalog.songs[rng.randrange(len(self.catalog.songs))]
+                 for _ in range(self.size)]
+        return [{
+            'name': name,
+            'artists': [{'name': artist}]
+        } for artist, name in songs[offset:offset + limit]]
+
+    def _page(self, items, offset, limit):
+        more = offset + limit < self.size
+        return items, f"https://bench.invalid/next?offset={offset + limit}" if more else None
+
+    def playlist_items(self, collection_id, offset=0, limit=100, **kwargs):
+        self._wait()
+        items, next_url = self._page(
+            self._tracks(collection_id, offset, limit), offset, limit)
+        return {'items': [{'track': item} for item in items], 'next': next_url}
+
+    def album_tracks(self, collection_id, limit=50, offset=0):
+        self._wait()
+        items, next_url = self._page(
+            self._tracks(collection_id, offset, limit), offset, limit)
+        return {'items': items, 'next': next_url}
+
+    def artist_top_tracks(self, collection_id):
+        self._wait()
+        return {'tracks': self._tracks(collection_id, 0, 10)}
+
+    def search(self, q, limit=1, **kwargs):
+        self._wait()
+        artist, name = self.catalog.pick()
+        return {'tracks': {'items': [{'name': name, 'artists': [{'name': artist}]}]}}
+
+
+class FakeSource:
+    # Misma interfaz que audio.TrackSource, sin lanzar ffmpeg
+
+    def __init__(self,
+                 track,
+                 volume=1.0,
+                 offset=0.0,
+                 executable=None,
+                 on_start=None):
+        self.track = track
+        self.volume = volume
+        self.offset = offset
+        self.executable = executable
+        self.on_start = on_start
+        self.frames = 0
+        self.exhausted = False
+
+    def read(self):
+        self.frames += 1
+        if self.frames == 1 and self.on_start:
+            self.on_start()
+        return b'\x00'
+
+    def cleanup(self):
+        pass
+
+    @property
+    def position(self):
+        return self.offset + self.frames * FRAME_SECONDS
+
+    @property
+    def stable(self):
+        return True
+
+    def interrupted(self, error=None):
+        return False
+
+
+class FakeVoiceClient:
+    # Simula el reproductor de discord.py: el primer paquete sale tras
+    # 'first_packet' segundos y la canción acaba a los 'track_seconds'
+
+    def __init__(self, guild, channel, stats, track_seconds, first_packet):
+        self.guild = guild
+        self.channel = channel
+        self.stats = stats
+        self.track_seconds = track_seconds
+        self.first_packet = first_packet
+        self.source = None
+        self.after = None
+        self.playing = False
+        self.paused = False
+        self.ended_at = None
+        self.timers = []
+
+    def is_playing(self):
+        return self.playing and not self.paused
+
+    def is_paused(self):
+        return self.playing and self.paused
+
+    def play(self, source, *, after=None):
+        if self.playing:
+            raise discord.ClientException('Already playing audio.')
+        if self.ended_at is not None:
+            self.stats['transition_gap'].append(time.perf_counter() -
+                                                self.ended_at)
+            self.ended_at = None
+        self.source = source
+        self.after = after
+        self.playing = True
+        self.paused = False
+        loop = asyncio.get_running_loop()
+        self.timers = [
+            loop.call_later(self.first_packet, source.read),
+            loop.call_later(self.track_seconds, self._finish, None),
+        ]
+
+    def _finish(self, error):
+        self._cancel()
+        self.playing = False
+        self.ended_at = time.perf_counter()
+        after, self.after = self.after, None
+        if after:
+            after(error)
+
+    def _cancel(self):
+        for timer in self.timers:
+            timer.cancel()
+        self.timers = []
+
+    def halt(self):
+        # stop() sin 'after': el benchmark llama a play_next directamente
+        self._cancel()
+        self.playing = False
+        self.after = None
+        self.ended_at = time.perf_counter()
+
+    def stop(self):
+        if self.playing:
+            asyncio.get_running_loop().call_soon(self._finish, None)
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+    async def disconnect(self, force=False):
+        self.halt()
+        self.guild.voice_client = None
+
+
+class FakeVoiceChannel:
+
+    def __init__(self, guild, stats, args):
+        self.guild = guild
+        self.stats = stats
+        self.args = args
+        self.name = f"voz-{guild.id}"
+        self.members = []
+
+    async def connect(self):
+        self.guild.voice_client = FakeVoiceClient(self.guild, self, self.stats,
+                                                  self.args.track_seconds,
+                                                  self.args.first_packet)
+        return self.guild.voice_client
+
+
+class FakeTextChannel:
+
+    def __init__(self, guild):
+        self.id = guild.id
+        self.name = f"texto-{guild.id}"
+
+
+class FakeMessage:
+    _ids = 0
+
+    def __init__(self, channel, stats, embed=None):
+        FakeMessage._ids += 1
+        self.id = FakeMessage._ids
+        self.channel = channel
+        self.stats = stats
+        self.embed = embed
+
+    async def add_reaction(self, emoji):
+        pass
+
+    async def remove_reaction(self, emoji, user):
+        pass
+
+    async def edit(self, embed=None, **kwargs):
+        self.stats['messages']['edited'] += 1
+        self.embed = embed
+
+
+class FakeAuthor:
+
+    def __init__(self, guild, channel):
+        self.id = guild.id
+        self.display_name = f"usuario-{guild.id}"
+        self.display_avatar = type('Avatar', (), {'url': 'https://bench.invalid/a.png'})()
+        self.voice = type('VoiceState', (), {'channel': channel})()
+
+
+class FakeGuild:
+
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = f"servidor-{guild_id}"
+        self.voice_client = None
+
+
+class FakeContext:
+    # Lo que usan los comandos de main.py de commands.Context
+
+    def __init__(self, guild_id, stats, args):
+        self.guild = FakeGuild(guild_id)
+        self.stats = stats
+        self.channel = FakeTextChannel(self.guild)
+        self.voice_channel = FakeVoiceChannel(self.guild, stats, args)
+        self.author = FakeAuthor(self.guild, self.voice_channel)
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def send(self, content=None, *, embed=None, view=None, **kwargs):
+        self.stats['messages']['sent'] += 1
+        return FakeMessage(self.channel, self.stats, embed)
+
+
+async def no_reactions(event, *, check=None, timeout=None):
+    # Nadie pulsa las reacciones de paginación ni de -move
+    raise asyncio.TimeoutError
+
+
+def install_fakes(args, catalog):
+    tracks_module.get_ydl = lambda profile: FakeYDL(
+        profile, catalog, args.search_latency
+        if profile == 'search' else args.stream_latency)
+    spotify = FakeSpotify(catalog, args.spotify_latency, args.spotify_tracks)
+    main.spotify = spotify
+    main.importer.spotify = spotify
+    main.recommender.spotify = spotify
+    main.TrackSource = FakeSource
+    main.bot.wait_for = no_reactions
+
+
+def reset_state():
+    for guild_id in list(main.players.players):
+        main.idle_monitor.forget(guild_id)
+        main.players.remove(guild_id)
+    main.track_cache = TrackCache(path=None)
+    main.tracks.cache = main.track_cache
+    main.search_sources = HedgedSearch(main.resolver,
+                                       build_sources(main.spotify))
+    main.tracks.hedge = main.search_sources
+    main.tracks.flights = SingleFlight()
+
+
+async def timed(stats, name, coro):
+    start = time.perf_counter()
+    try:
+        await coro
+    except Exception as e:
+        stats['errors'][name] = stats['errors'].get(name, 0) + 1
+        stats['error_types'][type(e).__name__] = stats['error_types'].get(
+            type(e).__name__, 0) + 1
+        return
+    stats['commands'].setdefault(name, []).append(time.perf_counter() - start)
+
+
+async def guild_session(ctx, args, catalog, stats, delay):
+    await asyncio.sleep(delay)
+    await timed(stats, 'play', main.play(ctx, query=catalog.query()))
+    for _ in range(args.songs - 1):
+        await timed(stats, 'play_queued', main.play(ctx, query=catalog.query()))
+    if args.spotify_tracks:
+        await timed(
+            stats, 'play_spotify',
+            main.play(ctx,
+                      query=f"https://open.spotify.com/playlist/bench{ctx.guild.id}"))
+    await timed(stats, 'queue', main.queue(ctx))
+    await timed(stats, 'move', main.move(ctx, 2, 1))
+    await timed(stats, 'save_playlist', main.save_playlist(ctx, name='bench'))
+    await timed(stats, 'load_playlist', main.load_playlist(ctx, name='bench'))
+    if ctx.voice_client:
+        ctx.voice_client.halt()
+    await timed(stats, 'play_next', main.play_next(ctx))
+
+
+async def sample_loop_lag(samples, interval=0.01):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, time.perf_counter() - start - interval))
+
+
+def teardown(contexts):
+    for ctx in contexts:
+        if ctx.voice_client:
+            ctx.voice_client.halt()
+    reset_state()
+
+
+async def run_scale(guilds, args, catalog, measure_memory=False):
+    reset_state()
+    stats = {
+        'commands': {},
+        'errors': {},
+        'error_types': {},
+        'transition_gap': [],
+        'messages': {
+            'sent': 0,
+            'edited': 0
+        },
+    }
+    lag = []
+    rng = random.Random(args.seed + guilds)
+    contexts = [FakeContext(next(_guild_ids), stats, args) for _ in range(guilds)]
+    gc.collect()
+    if measure_memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    sampler = asyncio.ensure_future(sample_loop_lag(lag))
+    start = time.perf_counter()
+    await asyncio.gather(*(guild_session(ctx, args, catalog, stats,
+                                         rng.uniform(0, args.ramp))
+                           for ctx in contexts))
+    elapsed = time.perf_counter() - start
+    # Las canciones siguen sonando: se miden los cambios de canción
+    await asyncio.sleep(args.dwell)
+    sampler.cancel()
+    memory = None
+    if measure_memory:
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory = {
+            'per_guild_bytes': (current - baseline) // guilds,
+            'retained_bytes': current - baseline,
+            'peak_bytes': peak - baseline,
+        }
+    completed = sum(len(samples) for samples in stats['commands'].values())
+    result = {
+        'guilds': guilds,
+        'wall_seconds': elapsed,
+        'commands_completed': completed,
+        'throughput_commands_per_second': completed / elapsed if elapsed else None,
+        'commands': {
+            name: dict(summarize(samples), errors=stats['errors'].get(name, 0))
+            for name, samples in sorted(stats['commands'].items())
+        },
+        'errors': stats['errors'],
+        'error_types': stats['error_types'],
+        'transition_gap_seconds': summarize(stats['transition_gap']),
+        'event_loop_lag_seconds': summarize(lag),
+        'messages': stats['messages'],
+        'cache': main.track_cache.stats(),
+        'search_sources': {
+            name: {
+                'successes': source.successes,
+                'failures': source.failures,
+                'latency': source.latency,
+            }
+            for name, source in main.search_sources.stats.items()
+        },
+        'players': len(main.players),
+        'memory': memory,
+    }
+    teardown(contexts)
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'],
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args):
+    # Los comandos usan bot.loop desde el 'after' de la reproducción
+    setup = getattr(main.bot, '_async_setup_hook', None)
+    if setup:
+        await setup()
+    else:
+        main.bot.loop = asyncio.get_running_loop()
+    # setup_hook no se ejecuta sin conexión a Discord
+    main.bot.controls = main.MusicControls()
+    catalog = Catalog(args.catalog, args.seed)
+    install_fakes(args, catalog)
+    scales = []
+    for guilds in args.guilds:
+        logging.warning(f"Benchmark: {guilds} servidores...")
+        result = await run_scale(guilds, args, catalog)
+        if args.memory:
+            result['memory'] = (await run_scale(guilds, args, catalog,
+                                                measure_memory=True))['memory']
+        scales.append(result)
+    return scales
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark sin red de los comandos del bot")
+    parser.add_argument('--guilds',
+                        default='1,100,1000',
+                        type=lambda value: [int(n) for n in value.split(',')],
+                        help="Servidores simulados por escenario")
+    parser.add_argument('--songs', type=int, default=5,
+                        help="-play por servidor")
+    parser.add_argument('--catalog', type=int, default=500,
+                        help="Canciones distintas del backend falso")
+    parser.add_argument('--search-latency', type=float, default=0.05)
+    parser.add_argument('--stream-latency', type=float, default=0.1)
+    parser.add_argument('--spotify-latency', type=float, default=0.02)
+    parser.add_argument('--spotify-tracks', type=int, default=10,
+                        help="Canciones de la playlist de Spotify importada "
+                        "por servidor (0 para no importar)")
+    parser.add_argument('--track-seconds', type=float, default=2.0,
+                        help="Duración simulada de cada canción")
+    parser.add_argument('--first-packet', type=float, default=0.005,
+                        help="Retardo simulado hasta el primer paquete")
+    parser.add_argument('--ramp', type=float, default=5.0,
+                        help="Segundos en los que llegan los servidores")
+    parser.add_argument('--dwell', type=float, default=5.0,
+                        help="Segundos de reproducción tras los comandos")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="No repetir cada escenario con tracemalloc")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+    random.seed(args.seed)
+    scales = asyncio.run(run(args))
+    results = {
+        'timestamp': time.time(),
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'discord_py': discord.__version__,
+        'config': {
+            key: value
+            for key, value in vars(args).items() if key != 'output'
+        },
+        'scales': scales,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    for scale in scales:
+        play = scale['commands'].get('play', {})
+        print(f"{scale['guilds']:>5} servidores: "
+              f"{scale['throughput_commands_per_second']:.1f} comandos/s, "
+              f"play p95 {play.get('p95') or 0:.3f}s, "
+              f"lag p99 {scale['event_loop_lag_seconds']['p99'] or 0:.3f}s")
+    print(f"Resultados en {args.output}")
+    main.resolver.shutdown()
+    main.playlist_store.close()
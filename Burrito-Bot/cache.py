@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from tracks import Track
+
+# Tamaños de la caché y ruta opcional para persistirla entre reinicios
+CACHE_MAX_QUERIES = int(os.getenv('CACHE_MAX_QUERIES', '2048'))
+CACHE_MAX_TRACKS = int(os.getenv('CACHE_MAX_TRACKS', '1024'))
+CACHE_DB_PATH = os.getenv('CACHE_DB_PATH')
+
+# Escrituras que el hilo de la caché agrupa en una misma transacción
+CACHE_WRITE_BATCH = 256
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+class LRU:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def get(self, key):
+        if key not in self.data:
+            return None
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+
+class TrackCache:
+    # Nivel 1: consulta normalizada -> id de vídeo
+    # Nivel 2: id de vídeo -> Track (la URL del stream caduca según 'expire')
+    # Con CACHE_DB_PATH el fichero se carga entero en memoria al arrancar
+    # (tiene los mismos límites) y las escrituras las hace un hilo propio:
+    # en el event loop solo se consultan los LRU.
+
+    def __init__(self,
+                 max_queries=CACHE_MAX_QUERIES,
+                 max_tracks=CACHE_MAX_TRACKS,
+                 path=CACHE_DB_PATH):
+        self.queries = LRU(max_queries)
+        self.tracks = LRU(max_tracks)
+        self.hits = {'query': 0, 'stream': 0}
+        self.misses = {'query': 0, 'stream': 0}
+        self.db = None
+        self.writes = queue.Queue()
+        self.writer = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS queries '
+                        '(query TEXT PRIMARY KEY, video_id TEXT NOT NULL, '
+                        'updated_at REAL NOT NULL)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS tracks '
+                        '(video_id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                        'updated_at REAL NOT NULL)')
+        # Mantiene el fichero dentro de los mismos límites que la memoria
+        self.db.execute(
+            'DELETE FROM queries WHERE query NOT IN (SELECT query FROM queries '
+            'ORDER BY updated_at DESC LIMIT ?)', (self.queries.maxsize, ))
+        self.db.execute(
+            'DELETE FROM tracks WHERE video_id NOT IN (SELECT video_id FROM '
+            'tracks ORDER BY updated_at DESC LIMIT ?)', (self.tracks.maxsize, ))
+        self.db.commit()
+        # De la más antigua a la más reciente, para respetar el orden del LRU
+        for key, video_id in self.db.execute(
+                'SELECT query, video_id FROM queries ORDER BY updated_at'):
+            self.queries.put(key, video_id)
+        for video_id, data in self.db.execute(
+                'SELECT video_id, data FROM tracks ORDER BY updated_at'):
+            self.tracks.put(video_id, Track(**json.loads(data)))
+        self.writer = threading.Thread(target=self._write_behind,
+                                       name='track-cache',
+                                       daemon=True)
+        self.writer.start()
+
+    def _write_behind(self):
+        # Hilo de escritura: vacía la cola en lotes, una transacción por lote.
+        # None indica que hay que terminar
+        while True:
+            batch = [self.writes.get()]
+            while len(batch) < CACHE_WRITE_BATCH:
+                try:
+                    batch.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+            rows = [item for item in batch if item is not None]
+            try:
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO tracks VALUES (?, ?, ?)',
+                    [(track.id, json.dumps(asdict(track)), now)
+                     for track, _, now in rows])
+                self.db.executemany(
+                    'INSERT OR REPLACE INTO queries VALUES (?, ?, ?)',
+                    [(key, track.id, now) for track, key, now in rows if key])
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error al guardar en la caché: {e}")
+            if len(rows) < len(batch):
+                return
+
+    def video_id(self, query):
+        key = normalize_query(query)
+        video_id = self.queries.get(key)
+        if video_id is None:
+            self.misses['query'] += 1
+        else:
+            self.hits['query'] += 1
+        return video_id
+
+    def track(self, video_id, need_stream=False):
+        track = self.tracks.get(video_id)
+        if need_stream:
+            if track is None or track.expired:
+                self.misses['stream'] += 1
+                return None
+            self.hits['stream'] += 1
+        return track
+
+    def lookup(self, query, need_stream=False):
+        video_id = self.video_id(query)
+        if video_id is None:
+            return None
+        return self.track(video_id, need_stream=need_stream)
+
+    def store(self, track, query=None):
+        previous = self.tracks.get(track.id)
+        if track.expired and previous and not previous.expired:
+            # Una búsqueda sin stream no pisa una URL todavía válida
+            track = previous
+        key = normalize_query(query) if query else None
+        self.tracks.put(track.id, track)
+        if key:
+            self.queries.put(key, track.id)
+        if self.writer:
+            self.writes.put((track, key, time.time()))
+
+    def stats(self):
+        stats = {'queries': len(self.queries), 'tracks': len(self.tracks)}
+        for tier in ('query', 'stream'):
+            total = self.hits[tier] + self.misses[tier]
+            stats[f'{tier}_hits'] = self.hits[tier]
+            stats[f'{tier}_misses'] = self.misses[tier]
+            stats[f'{tier}_hit_rate'] = self.hits[tier] / total if total else 0.0
+        return stats
+
+    def close(self):
+        # Termina de escribir lo pendiente antes de cerrar el fichero
+        if self.writer:
+            self.writes.put(None)
+            self.writer.join()
+            self.writer = None
+        if self.db:
+            self.db.close()
+            self.db = None
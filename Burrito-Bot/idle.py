@@ -0,0 +1,177 @@
+import os
+import math
+import time
+import asyncio
+import logging
+
+# Sin reproducir nada (cola terminada o en pausa) durante IDLE_TIMEOUT, o
+# solo en el canal durante ALONE_TIMEOUT, el bot se desconecta
+IDLE_TIMEOUT = float(os.getenv('IDLE_TIMEOUT', '900'))
+ALONE_TIMEOUT = float(os.getenv('ALONE_TIMEOUT', '120'))
+
+# Precisión de los plazos y huecos de la rueda (256 x 5 s = 21 min por
+# vuelta; los plazos más largos dan varias vueltas)
+WHEEL_RESOLUTION = 5.0
+WHEEL_SLOTS = 256
+
+
+class TimerWheel:
+    # Rueda de temporizadores: un único bucle que avanza un hueco cada
+    # 'resolution' segundos y dispara las claves vencidas. Programar o
+    # cancelar es O(1) y hay como mucho un plazo por clave.
+
+    def __init__(self, callback, resolution=WHEEL_RESOLUTION, slots=WHEEL_SLOTS):
+        self.callback = callback
+        self.resolution = resolution
+        self.slots = [set() for _ in range(slots)]
+        self.where = {}  # clave -> [hueco, vueltas pendientes]
+        self.cursor = 0
+        self.task = None
+
+    def __len__(self):
+        return len(self.where)
+
+    def __contains__(self, key):
+        return key in self.where
+
+    def schedule(self, key, delay):
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.resolution))
+        slot = (self.cursor + ticks) % len(self.slots)
+        self.slots[slot].add(key)
+        self.where[key] = [slot, (ticks - 1) // len(self.slots)]
+
+    def cancel(self, key):
+        entry = self.where.pop(key, None)
+        if entry is not None:
+            self.slots[entry[0]].discard(key)
+
+    def advance(self):
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        due = []
+        for key in list(self.slots[self.cursor]):
+            entry = self.where[key]
+            if entry[1] > 0:
+                entry[1] -= 1
+            else:
+                self.slots[self.cursor].discard(key)
+                del self.where[key]
+                due.append(key)
+        for key in due:
+            try:
+                self.callback(key)
+            except Exception as e:
+                logging.error(f"Error en el temporizador de {key}: {e}")
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        # Con el loop ocupado se recuperan los huecos atrasados de golpe
+        next_tick = time.monotonic() + self.resolution
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            while time.monotonic() >= next_tick:
+                self.advance()
+                next_tick += self.resolution
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+
+class VoiceSession:
+
+    def __init__(self):
+        self.idle_since = time.monotonic()  # None mientras suena algo
+        self.alone_since = None  # None mientras hay alguien escuchando
+
+
+class IdleMonitor:
+    # Actividad y oyentes de cada conexión de voz. Los eventos (cambios de
+    # canción, pausa, on_voice_state_update) solo actualizan marcas de tiempo
+    # y el plazo de la rueda; al vencer se comprueba el estado y, si sigue
+    # inactiva, se llama a reap(guild_id, motivo).
+
+    def __init__(self, reap, idle_timeout=IDLE_TIMEOUT,
+                 alone_timeout=ALONE_TIMEOUT):
+        self.reap = reap
+        self.idle_timeout = idle_timeout
+        self.alone_timeout = alone_timeout
+        self.sessions = {}
+        self.wheel = TimerWheel(self._expired)
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def start(self):
+        self.wheel.start()
+
+    def _session(self, guild_id):
+        session = self.sessions.get(guild_id)
+        if session is None:
+            session = self.sessions[guild_id] = VoiceSession()
+        return session
+
+    def _deadline(self, session):
+        deadlines = []
+        if session.idle_since is not None:
+            deadlines.append(session.idle_since + self.idle_timeout)
+        if session.alone_since is not None:
+            deadlines.append(session.alone_since + self.alone_timeout)
+        return min(deadlines) if deadlines else None
+
+    def _schedule(self, guild_id):
+        deadline = self._deadline(self._session(guild_id))
+        if deadline is None:
+            self.wheel.cancel(guild_id)
+        else:
+            self.wheel.schedule(guild_id, deadline - time.monotonic())
+
+    def connected(self, guild_id, listeners, playing):
+        session = self._session(guild_id)
+        if playing:
+            session.idle_since = None
+        self.listeners(guild_id, listeners)
+
+    def listeners(self, guild_id, count):
+        session = self._session(guild_id)
+        if count:
+            session.alone_since = None
+        elif session.alone_since is None:
+            session.alone_since = time.monotonic()
+        self._schedule(guild_id)
+
+    def playing(self, guild_id):
+        self._session(guild_id).idle_since = None
+        self._schedule(guild_id)
+
+    def stopped(self, guild_id):
+        session = self._session(guild_id)
+        if session.idle_since is None:
+            session.idle_since = time.monotonic()
+        self._schedule(guild_id)
+
+    def forget(self, guild_id):
+        self.wheel.cancel(guild_id)
+        self.sessions.pop(guild_id, None)
+
+    def _expired(self, guild_id):
+        session = self.sessions.get(guild_id)
+        if session is None:
+            return
+        now = time.monotonic()
+        if (session.alone_since is not None
+                and now - session.alone_since >= self.alone_timeout):
+            reason = 'alone'
+        elif (session.idle_since is not None
+              and now - session.idle_since >= self.idle_timeout):
+            reason = 'idle'
+        else:
+            # Hubo actividad desde que se programó
+            self._schedule(guild_id)
+            return
+        self.forget(guild_id)
+        asyncio.ensure_future(self.reap(guild_id, reason))
@@ -0,0 +1,188 @@
+import os
+import re
+import asyncio
+import logging
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+import yt_dlp as youtube_dl
+from resolver import ResolverBusy, ResolverTimeout
+from tracks import track_from_info
+
+# Límites de las importaciones masivas
+IMPORT_PAGE_SIZE = int(os.getenv('IMPORT_PAGE_SIZE', '50'))
+IMPORT_CONCURRENCY = int(os.getenv('IMPORT_CONCURRENCY', '4'))
+IMPORT_MAX_TRACKS = int(os.getenv('IMPORT_MAX_TRACKS', '1000'))
+IMPORT_RETRIES = 5
+
+# Listado plano: solo id, título y duración de cada vídeo
+PLAYLIST_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'extract_flat': True,
+}
+
+SPOTIFY_URL = re.compile(
+    r'(?:open\.spotify\.com/(?:intl-[\w-]+/)?|spotify:)'
+    r'(playlist|album|artist)[/:]([A-Za-z0-9]+)')
+
+UNAVAILABLE_TITLES = ('[Private video]', '[Deleted video]')
+
+
+def parse_spotify_url(query):
+    match = SPOTIFY_URL.search(query)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def is_youtube_playlist(query):
+    url = urlparse(query)
+    if not url.netloc.endswith(('youtube.com', 'youtu.be')):
+        return False
+    params = parse_qs(url.query)
+    # Un enlace watch?v=...&list=... reproduce solo ese vídeo
+    return 'list' in params and 'v' not in params
+
+
+def is_collection(query):
+    return is_youtube_playlist(query) or parse_spotify_url(query) is not None
+
+
+class YoutubePlaylist:
+    # Recorre una playlist de YouTube página a página con extracción plana;
+    # yt-dlp va pidiendo las continuaciones conforme se consumen entradas.
+
+    def __init__(self, url):
+        self.ydl = youtube_dl.YoutubeDL(PLAYLIST_OPTS)
+        info = self.ydl.extract_info(url, download=False, process=False)
+        if info.get('_type') == 'url':
+            info = self.ydl.extract_info(info['url'],
+                                         download=False,
+                                         process=False)
+        self.entries = iter(info.get('entries') or [])
+
+    def next_page(self, size):
+        page = []
+        for info in islice(self.entries, size):
+            if not info or info.get('title') in UNAVAILABLE_TITLES:
+                continue
+            page.append(track_from_info(info, with_stream=False).to_entry())
+        return page
+
+    def close(self):
+        self.ydl.close()
+
+
+def spotify_page(spotify, kind, collection_id, offset, limit):
+    # Devuelve (canciones, hay_más) usando los endpoints paginados
+    if kind == 'playlist':
+        result = spotify.playlist_items(
+            collection_id,
+            offset=offset,
+            limit=min(limit, 100),
+            fields='items(track(name,artists(name))),next',
+            additional_types=('track', ))
+        items = [item['track'] for item in result['items'] if item.get('track')]
+        return items, result.get('next') is not None
+    if kind == 'album':
+        result = spotify.album_tracks(collection_id,
+                                      limit=min(limit, 50),
+                                      offset=offset)
+        return result['items'], result.get('next') is not None
+    # Artista: sus canciones más populares (una sola página)
+    if offset:
+        return [], False
+    return spotify.artist_top_tracks(collection_id)['tracks'], False
+
+
+def spotify_query(track):
+    return f"{track['name']} {track['artists'][0]['name']}"
+
+
+class CollectionImporter:
+    # Expande playlists/álbumes en entradas de cola que se entregan por
+    # páginas, para ir encolando mientras llega el resto.
+
+    def __init__(self, pool, tracks, spotify):
+        self.pool = pool
+        self.tracks = tracks
+        self.spotify = spotify
+
+    async def _run(self, func, *args, retry_timeout=True):
+        # Como pool.run, pero con el pool saturado espera y reintenta en vez
+        # de abortar la importación
+        for attempt in range(IMPORT_RETRIES):
+            try:
+                return await self.pool.run(func, *args)
+            except ResolverTimeout:
+                if not retry_timeout or attempt == IMPORT_RETRIES - 1:
+                    raise
+            except ResolverBusy:
+                if attempt == IMPORT_RETRIES - 1:
+                    raise
+            await asyncio.sleep(1 + attempt)
+
+    async def pages(self, query):
+        spotify_ref = parse_spotify_url(query)
+        if spotify_ref:
+            async for page in self._spotify_pages(*spotify_ref):
+                yield page
+        else:
+            async for page in self._youtube_pages(query):
+                yield page
+
+    async def _youtube_pages(self, url):
+        playlist = await self._run(YoutubePlaylist, url)
+        try:
+            imported = 0
+            while imported < IMPORT_MAX_TRACKS:
+                size = min(IMPORT_PAGE_SIZE, IMPORT_MAX_TRACKS - imported)
+                # Tras un timeout el hilo puede seguir leyendo del mismo
+                # iterador: solo se reintenta si el pool estaba lleno
+                page = await self._run(playlist.next_page,
+                                       size,
+                                       retry_timeout=False)
+                if not page:
+                    break
+                imported += len(page)
+                yield page
+        finally:
+            playlist.close()
+
+    async def _spotify_pages(self, kind, collection_id):
+        offset = 0
+        semaphore = asyncio.Semaphore(IMPORT_CONCURRENCY)
+        while offset < IMPORT_MAX_TRACKS:
+            items, more = await self._run(spotify_page, self.spotify, kind,
+                                          collection_id, offset,
+                                          IMPORT_PAGE_SIZE)
+            items = items[:IMPORT_MAX_TRACKS - offset]
+            offset += len(items)
+            # Emparejamiento con concurrencia limitada; las entradas se
+            # entregan en orden en cuanto están listas
+            matches = [
+                asyncio.ensure_future(self._match(semaphore, track))
+                for track in items
+            ]
+            try:
+                for match in matches:
+                    entry = await match
+                    if entry:
+                        yield [entry]
+            finally:
+                for match in matches:
+                    match.cancel()
+            if not more or not items:
+                break
+
+    async def _match(self, semaphore, track):
+        query = spotify_query(track)
+        async with semaphore:
+            for attempt in range(IMPORT_RETRIES):
+                try:
+                    result = await self.tracks.search(query)
+                    return result.to_entry(query) if result else None
+                except (ResolverBusy, ResolverTimeout):
+                    # El pool está saturado: se espera un poco y se reintenta
+                    await asyncio.sleep(1 + attempt)
+        logging.warning(f"No se pudo emparejar en YouTube: {query}")
+        return None
@@ -1,24 +1,80 @@
-from flask import Flask
-from threading import Thread
+import os
+from aiohttp import web
+from metrics import REGISTRY, loop_monitor, HEALTH_MAX_LOOP_LAG
 
-app = Flask('')
+PORT = int(os.getenv('PORT', '8080'))
 
+# Máximo de entradas de cola por petición en /guilds/{id}
+MAX_QUEUE_LIMIT = 100
 
-@app.route('/')
-def home():
-    return "¡Estoy vivo!"
+routes = web.RouteTableDef()
 
 
-def run():
-    app.run(host='0.0.0.0', port=8080)
+@routes.get('/')
+async def home(request):
+    return web.Response(text="¡Estoy vivo!")
 
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+@routes.get('/metrics')
+async def metrics(request):
+    return web.Response(text=REGISTRY.render(),
+                        content_type='text/plain',
+                        charset='utf-8',
+                        headers={'X-Content-Type-Options': 'nosniff'})
 
-if __name__ == "__main__":
-    keep_alive()
-    while True:
-        pass
 
+@routes.get('/health')
+async def health(request):
+    # Se sirve desde el mismo loop que el bot: si el loop está bloqueado ni
+    # siquiera llega a responder, y tras un bloqueo se informa del retardo
+    lag = loop_monitor.current_lag()
+    if lag > HEALTH_MAX_LOOP_LAG:
+        return web.Response(text=f"Event loop bloqueado ({lag:.1f}s)",
+                            status=503)
+    if not loop_monitor.started:
+        return web.Response(text="Iniciando")
+    return web.Response(text=f"OK ({lag:.3f}s)")
+
+
+@routes.get('/guilds')
+async def guilds(request):
+    status = request.app['status']
+    return web.json_response(status.guilds() if status else [])
+
+
+@routes.get(r'/guilds/{guild_id:\d+}')
+async def guild(request):
+    status = request.app['status']
+    try:
+        offset = max(0, int(request.query.get('offset', 0)))
+        limit = min(MAX_QUEUE_LIMIT, max(0, int(request.query.get('limit',
+                                                                   25))))
+    except ValueError:
+        raise web.HTTPBadRequest(text="offset y limit deben ser enteros")
+    data = status.guild(int(request.match_info['guild_id']), offset,
+                        limit) if status else None
+    if data is None:
+        raise web.HTTPNotFound(text="Servidor sin reproductor")
+    return web.json_response(data)
+
+
+def create_app(status=None):
+    # 'status' expone guilds() y guild(guild_id, offset, limit) en modo
+    # solo lectura
+    app = web.Application()
+    app['status'] = status
+    app.add_routes(routes)
+    return app
+
+
+async def keep_alive(status=None, host='0.0.0.0', port=PORT):
+    # Arranca el servidor HTTP en el loop actual (el del bot) y devuelve el
+    # runner para pararlo con runner.cleanup()
+    runner = web.AppRunner(create_app(status), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=PORT)
@@ -0,0 +1,140 @@
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import subprocess
+import urllib.request
+
+# Lanza varios procesos de main.py, cada uno con una parte de los shards, para
+# repartir el trabajo de ffmpeg/Opus entre núcleos. Cada proceso es dueño de
+# sus servidores y de su audio.
+#
+#   LAUNCHER_PROCESSES=4 python launcher.py
+
+logging.basicConfig(level=logging.INFO, format='[launcher] %(message)s')
+
+DISCORD_TOKEN = os.getenv('DISCORD_TOKEN')
+
+# Procesos a lanzar (por defecto, uno por núcleo) y shards en total (por
+# defecto, los que recomienda Discord)
+LAUNCHER_PROCESSES = int(os.getenv('LAUNCHER_PROCESSES', str(os.cpu_count() or 1)))
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+
+# Cada proceso sirve la API de estado en PORT + su índice
+BASE_PORT = int(os.getenv('PORT', '8080'))
+
+# Discord permite un IDENTIFY cada 5 segundos: los procesos arrancan
+# escalonados para no pisarse
+IDENTIFY_INTERVAL = 5.5
+
+# Espera antes de relanzar un proceso que ha terminado con error
+RESTART_DELAY = 10
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+
+def recommended_shards(token):
+    request = urllib.request.Request(
+        'https://discord.com/api/v10/gateway/bot',
+        headers={
+            'Authorization': f'Bot {token}',
+            'User-Agent': 'DiscordBot (Burrito-Bot launcher)',
+        })
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return json.load(response)['shards']
+
+
+def split_shards(shard_count, processes):
+    # Reparto round-robin: 0,4,8... al primero, 1,5,9... al segundo, etc.
+    processes = max(1, min(processes, shard_count))
+    return [list(range(index, shard_count, processes))
+            for index in range(processes)]
+
+
+class Worker:
+
+    def __init__(self, index, shard_ids, shard_count):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+
+    def env(self):
+        env = dict(os.environ,
+                   SHARD_IDS=','.join(map(str, self.shard_ids)),
+                   SHARD_COUNT=str(self.shard_count),
+                   PORT=str(BASE_PORT + self.index))
+        if env.get('AUDIO_CACHE_DIR'):
+            # Cada proceso mantiene su propio índice de la caché de audio
+            env['AUDIO_CACHE_DIR'] = os.path.join(env['AUDIO_CACHE_DIR'],
+                                                  f'proceso-{self.index}')
+        return env
+
+    def start(self):
+        logging.info(f"Proceso {self.index}: shards {self.shard_ids}")
+        self.process = subprocess.Popen([sys.executable, MAIN],
+                                        env=self.env())
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+
+
+def main():
+    shard_count = SHARD_COUNT or recommended_shards(DISCORD_TOKEN)
+    workers = [
+        Worker(index, shard_ids, shard_count)
+        for index, shard_ids in enumerate(
+            split_shards(shard_count, LAUNCHER_PROCESSES))
+    ]
+    stopping = False
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for worker in workers:
+        if stopping:
+            break
+        worker.start()
+        time.sleep(IDENTIFY_INTERVAL * len(worker.shard_ids))
+
+    restarts = {}
+    while not stopping:
+        for worker in workers:
+            if worker.process is None:
+                continue
+            code = worker.process.poll()
+            if code is None or stopping:
+                continue
+            if code == 0:
+                # Salida limpia (p. ej. SIGTERM al propio proceso): se
+                # apaga todo
+                shutdown(None, None)
+                break
+            due = restarts.setdefault(worker.index,
+                                      time.monotonic() + RESTART_DELAY)
+            if time.monotonic() >= due:
+                del restarts[worker.index]
+                logging.warning(f"Proceso {worker.index} terminó con código "
+                                f"{code}, relanzando")
+                worker.start()
+        time.sleep(1)
+
+    for worker in workers:
+        if worker.process:
+            try:
+                worker.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+
+
+if __name__ == "__main__":
+    main()
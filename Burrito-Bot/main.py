@@ -1,14 +1,28 @@
 import os
+import time
+import signal
 import asyncio
 import logging
-from collections import deque
-from threading import Thread
 import discord
-from discord.ext import commands
-import yt_dlp as youtube_dl
+from discord.ext import commands, tasks
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
 import keep_alive
+from resolver import Resolver, ResolverBusy, ResolverTimeout, TrackResolver
+from tracks import Track, warm_up
+from cache import TrackCache
+from sources import HedgedSearch, build_sources
+from player import PlayerManager
+from autoplay import Recommender
+from importer import CollectionImporter, is_collection
+from audio import (TrackSource, restart_source, current_position, format_time,
+                   parse_time, STREAM_RESUME_RETRIES)
+from playlist_store import PlaylistStore
+from outbox import Outbox
+from idle import IdleMonitor
+from audio_cache import AudioCache, AUDIO_CACHE_DIR
+from metrics import (REGISTRY, loop_monitor, observer, PLAY_LATENCY,
+                     TRANSITION_GAP)
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -20,50 +34,274 @@ SPOTIPY_CLIENT_SECRET = os.getenv('SPOTIPY_CLIENT_SECRET')
 spotify = spotipy.Spotify(client_credentials_manager=SpotifyClientCredentials(
     client_id=SPOTIPY_CLIENT_ID, client_secret=SPOTIPY_CLIENT_SECRET))
 
-# Configura los intents
-intents = discord.Intents.default()
+# Configura los intents: solo lo que necesitan los comandos y la voz (sin
+# los privilegiados de presencias y miembros)
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+intents.guild_reactions = True  # Paginación con reacciones
 intents.message_content = True
 intents.voice_states = True
-intents.presences = True
-intents.members = True
 
-# Configura el bot de Discord
-bot = commands.Bot(command_prefix='-', intents=intents)
+# Shards: sin configurar se usan los que recomienda Discord, todos en este
+# proceso. launcher.py reparte SHARD_IDS entre varios procesos
+SHARD_COUNT = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+SHARD_IDS = [int(shard) for shard in os.getenv('SHARD_IDS').split(',')
+             ] if os.getenv('SHARD_IDS') else None
+
+# Segundos máximos para desconectar las llamadas de voz al apagar
+SHUTDOWN_TIMEOUT = 10
+
+
+class BurritoBot(commands.AutoShardedBot):
+    # El servidor HTTP de estado comparte el loop del bot y se para con él
+
+    web_runner = None
+    controls = None  # Vista persistente de los mensajes "Ahora suena"
+    warmed_up = False  # on_ready se repite tras cada reconexión
+
+    async def setup_hook(self):
+        self.controls = MusicControls()
+        self.add_view(self.controls)
+        self.web_runner = await keep_alive.keep_alive(BotStatus())
+        try:
+            self.loop.add_signal_handler(
+                signal.SIGTERM, lambda: asyncio.ensure_future(self.close()))
+        except (NotImplementedError, RuntimeError):
+            # Windows no admite manejadores de señales en el loop
+            pass
+
+    async def close(self):
+        await drain_voice_connections()
+        if self.web_runner:
+            await self.web_runner.cleanup()
+            self.web_runner = None
+        await super().close()
+
+
+# Configura el bot de Discord. Sin caché de miembros: los estados de voz
+# (ctx.author.voice) se guardan igualmente con el intent voice_states
+bot = BurritoBot(command_prefix='-',
+                 intents=intents,
+                 member_cache_flags=discord.MemberCacheFlags.none(),
+                 chunk_guilds_at_startup=False,
+                 shard_count=SHARD_COUNT,
+                 shard_ids=SHARD_IDS)
 
 # Variables globales
-music_queue = deque()
-current_song = None
-current_song_url = None
-disconnect_timer = None
 current_embed_color = discord.Color.green()  # Color predeterminado para embeds
-autoplay = False  # Variable de control para autoplay
+
+# Avisos agrupados y envíos al ritmo que permite cada canal
+outbox = Outbox(current_embed_color)
 
 # Especifica la ruta completa a ffmpeg
 FFMPEG_PATH = os.getenv('FFMPEG_PATH')
 
-# Variables de control
-loop = False
-shuffle = False
-playlists = {}
-
-# Configuración de youtube_dl
-ydl_opts = {
-    'format':
-    'bestaudio/best',
-    'postprocessors': [{
-        'key': 'FFmpegExtractAudio',
-        'preferredcodec': 'mp3',
-        'preferredquality': '192',
-    }],
-    'quiet':
-    True,
-}
-
+# Canciones por página en el comando queue
+QUEUE_PAGE_SIZE = 10
+
+# Si el pool está saturado al cambiar de canción, la siguiente vuelve al
+# principio de la cola y se reintenta con espera exponencial. Un timeout se
+# reintenta PLAY_RETRIES veces antes de darla por fallida
+PLAY_RETRY_DELAY = 2.0
+PLAY_RETRY_MAX_DELAY = 30.0
+PLAY_RETRIES = 3
+
+# Playlists por página en view_playlists y entradas por lote al cargarlas
+PLAYLISTS_PAGE_SIZE = 10
+PLAYLIST_LOAD_BATCH = 100
+
+# Pool para las llamadas bloqueantes de yt-dlp y Spotify
+resolver = Resolver()
+track_cache = TrackCache()
+
+# Búsqueda escalonada en YouTube, YouTube Music, SoundCloud y Spotify
+search_sources = HedgedSearch(resolver, build_sources(spotify))
+tracks = TrackResolver(resolver, track_cache, hedge=search_sources)
+
+# Copia local del audio de las canciones más escuchadas (opcional)
+audio_cache = AudioCache() if AUDIO_CACHE_DIR else None
+
+# Playlists guardadas, por servidor
+playlist_store = PlaylistStore()
+
+# Expansión de playlists de YouTube y colecciones de Spotify
+importer = CollectionImporter(resolver, tracks, spotify)
+
+# Canciones relacionadas para el autoplay (Mix de YouTube / Spotify)
+recommender = Recommender(resolver, tracks, spotify)
+
+# Estado de reproducción de cada servidor (cola, canción actual, ajustes)
+players = PlayerManager(tracks, recommender)
+
+# Desconexión de las llamadas inactivas o sin oyentes, con una única rueda
+# de temporizadores para todos los servidores
+idle_monitor = IdleMonitor(lambda guild_id, reason: reap_voice(guild_id, reason))
+
+
+class BotStatus:
+    # Vista de solo lectura del estado de los servidores para la API HTTP
+
+    def _summary(self, guild_id, player):
+        guild = bot.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        current = None
+        if player.current:
+            position = current_position(voice_client)
+            current = {
+                'title': player.current.title,
+                'url': player.current.webpage_url,
+                'duration': player.current.duration,
+                'position': round(position, 1) if position is not None else None,
+            }
+        return {
+            'guild_id': str(guild_id),
+            'name': guild.name if guild else None,
+            'connected': voice_client is not None,
+            'paused': bool(voice_client and voice_client.is_paused()),
+            'now_playing': current,
+            'queue_length': len(player.queue),
+            'loop': player.loop,
+            'shuffle': player.shuffle,
+            'autoplay': player.autoplay,
+            'volume': round(player.volume * 100),
+        }
+
+    def guilds(self):
+        return [
+            self._summary(guild_id, player)
+            for guild_id, player in list(players.players.items())
+        ]
+
+    def guild(self, guild_id, offset, limit):
+        player = players.peek(guild_id)
+        if player is None:
+            return None
+        data = self._summary(guild_id, player)
+        data['queue'] = [{
+            'position': offset + index + 1,
+            'entry_id': entry_id,
+            'title': entry['title'],
+            'url': entry.get('url'),
+            'duration': entry.get('duration'),
+        } for index, (entry_id, entry) in enumerate(
+            player.queue.page(offset, limit))]
+        return data
+
+
+async def drain_voice_connections():
+    # Detiene la reproducción sin pasar a la siguiente canción y cierra las
+    # llamadas de voz antes de apagar el bot
+    for guild_id in list(players.players):
+        players.remove(guild_id)
+    voice_clients = list(bot.voice_clients)
+    for voice_client in voice_clients:
+        voice_client.stop()
+    if voice_clients:
+        await asyncio.wait([
+            asyncio.ensure_future(voice_client.disconnect(force=True))
+            for voice_client in voice_clients
+        ],
+                           timeout=SHUTDOWN_TIMEOUT)
+
+
+# Métricas que se calculan al servir /metrics
+REGISTRY.gauge(
+    'burrito_queue_length', 'Canciones en cola por servidor', lambda: [
+        ({'guild': guild_id}, len(player.queue))
+        for guild_id, player in list(players.players.items())
+    ])
+REGISTRY.gauge('burrito_guild_players', 'Reproductores de servidor en memoria',
+               lambda: len(players))
+REGISTRY.gauge('burrito_voice_connections', 'Conexiones de voz activas',
+               lambda: len(bot.voice_clients))
+REGISTRY.gauge('burrito_idle_timers',
+               'Servidores con desconexión por inactividad programada',
+               lambda: len(idle_monitor.wheel))
+REGISTRY.gauge('burrito_ffmpeg_processes', 'Procesos ffmpeg en marcha',
+               lambda: TrackSource.active)
+REGISTRY.gauge(
+    'burrito_cache_hit_ratio', 'Tasa de aciertos de la caché de canciones',
+    lambda: [({'tier': tier}, track_cache.stats()[f'{tier}_hit_rate'])
+             for tier in ('query', 'stream')])
+REGISTRY.gauge(
+    'burrito_cache_requests', 'Consultas a la caché de canciones', lambda: [
+        ({'tier': tier, 'result': result}, track_cache.stats()[f'{tier}_{result}'])
+        for tier in ('query', 'stream') for result in ('hits', 'misses')
+    ])
+
+REGISTRY.gauge(
+    'burrito_search_source_requests', 'Búsquedas terminadas por fuente',
+    lambda: [({'source': name, 'result': 'success'}, stats.successes)
+             for name, stats in search_sources.stats.items()] +
+    [({'source': name, 'result': 'failure'}, stats.failures)
+     for name, stats in search_sources.stats.items()])
+REGISTRY.gauge(
+    'burrito_search_source_latency_seconds',
+    'Latencia media (móvil) de las búsquedas con resultado por fuente',
+    lambda: [({'source': name}, stats.latency)
+             for name, stats in search_sources.stats.items()
+             if stats.latency is not None])
 
 # Eventos del bot
 @bot.event
 async def on_ready():
     logging.info(f'Bot {bot.user} está listo y conectado!')
+    loop_monitor.start()
+    # Instancias de yt-dlp listas en cada hilo antes del primer -play. Solo
+    # la primera vez: tras una reconexión ocuparía todos los hilos mientras
+    # haya extracciones en curso
+    if not bot.warmed_up:
+        bot.warmed_up = True
+        try:
+            await resolver.run_on_each_worker(warm_up)
+        except Exception as e:
+            logging.warning(f"No se pudo precalentar yt-dlp: {e}")
+    if not evict_idle_players.is_running():
+        evict_idle_players.start()
+    idle_monitor.start()
+
+
+@bot.event
+async def on_guild_remove(guild):
+    idle_monitor.forget(guild.id)
+    players.remove(guild.id)
+
+
+@bot.event
+async def on_voice_state_update(member, before, after):
+    guild = member.guild
+    if member.id == bot.user.id:
+        if after.channel is None:
+            # Desconectado (-leave, expulsado o caída de la llamada): se
+            # libera el estado del servidor
+            idle_monitor.forget(guild.id)
+            players.remove(guild.id)
+        else:
+            voice_client = guild.voice_client
+            idle_monitor.connected(
+                guild.id, listener_count(after.channel), voice_client
+                is not None and voice_client.is_playing())
+        return
+    voice_client = guild.voice_client
+    if voice_client is None or before.channel == after.channel:
+        return
+    channel_id = voice_client.channel.id
+    if channel_id in (getattr(before.channel, 'id', None),
+                      getattr(after.channel, 'id', None)):
+        idle_monitor.listeners(guild.id, listener_count(voice_client.channel))
+
+
+def is_connected(guild_id):
+    guild = bot.get_guild(guild_id)
+    return guild is not None and guild.voice_client is not None
+
+
+@tasks.loop(minutes=5)
+async def evict_idle_players():
+    evicted = players.evict_idle(is_connected)
+    if evicted:
+        logging.info(f"Liberados {evicted} reproductores inactivos")
 
 
 @bot.event
@@ -78,6 +316,9 @@ async def on_command_error(ctx, error):
             description=
             "⚠️ Comando no encontrado. Usa `-comandos` para ver la lista de comandos disponibles.",
             color=discord.Color.red()))
+    elif isinstance(getattr(error, 'original', None),
+                    (ResolverBusy, ResolverTimeout)):
+        await send_resolver_error(ctx, error.original)
     else:
         await ctx.send(embed=discord.Embed(
             description="⚠️ Ocurrió un error al ejecutar el comando.",
@@ -85,107 +326,193 @@ async def on_command_error(ctx, error):
         raise error
 
 
-# Funciones de búsqueda y reproducción
-def search_youtube(query):
-    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(f"ytsearch:{query}", download=False)
-            if info['entries']:
-                return info['entries'][0]
-            return None
-        except Exception as e:
-            logging.error(f"Error al buscar en YouTube: {e}")
-            return None
-
-
-def search_spotify(query):
-    results = spotify.search(q=query, limit=1)
-    if results['tracks']['items']:
-        track = results['tracks']['items'][0]
-        youtube_query = f"{track['name']} {track['artists'][0]['name']}"
-        return search_youtube(youtube_query)
-    return None
-
-
-async def play_next(ctx):
-    global current_song, current_song_url, autoplay
-    if music_queue:
-        next_song = music_queue.popleft()
-        await play(ctx, query=next_song['query'], from_queue=True)
-    elif autoplay:
-        await add_random_song_to_queue(ctx)
-        await play_next(ctx)
+async def send_resolver_error(ctx, error):
+    if isinstance(error, ResolverBusy):
+        description = "⚠️ Hay demasiadas búsquedas en curso. Intenta de nuevo en unos segundos."
     else:
-        current_song, current_song_url = None, None
-        embed = discord.Embed(
-            title="Cola terminada 🛑",
-            description=
-            "No quedan más canciones por reproducir.\nPuedes activar -autoplay para que la cola nunca acabe.",
-            color=discord.Color.red())
-        await ctx.send(embed=embed)
-        start_disconnect_timer(ctx)
+        description = "⚠️ La búsqueda tardó demasiado. Intenta de nuevo."
+    await ctx.send(embed=discord.Embed(description=description,
+                                       color=discord.Color.orange()))
 
 
-def start_disconnect_timer(ctx):
-    global disconnect_timer
-    if disconnect_timer:
-        disconnect_timer.cancel()
-    disconnect_timer = asyncio.get_event_loop().call_later(
-        900, lambda: asyncio.ensure_future(disconnect_from_voice(ctx)))
+# Funciones de búsqueda y reproducción
+def local_copy(track):
+    if audio_cache is None or not track.id:
+        return None
+    return audio_cache.local_track(track)
+
+
+def retry_later(ctx, player, entry):
+    # Vuelve a llamar a play_next pasada la espera, sin retener el lock: si
+    # mientras tanto un -play arranca otra canción, el reintento no hace nada
+    # y la entrada sigue la primera de la cola
+    if player.retry_attempts == 0:
+        outbox.error(
+            ctx, f"⏳ Hay demasiadas búsquedas en curso. Reintentando "
+            f"{entry['title']} en unos segundos...")
+    delay = min(PLAY_RETRY_MAX_DELAY,
+                PLAY_RETRY_DELAY * 2**player.retry_attempts)
+    player.retry_attempts += 1
+
+    async def retry():
+        await asyncio.sleep(delay)
+        if not player.closed:
+            await play_next(ctx)
 
+    asyncio.ensure_future(retry())
 
-async def disconnect_from_voice(ctx):
-    if ctx.voice_client and not ctx.voice_client.is_playing() and len(
-            ctx.voice_client.channel.members) == 1:
-        await ctx.voice_client.disconnect()
-        await ctx.send(
-            embed=discord.Embed(description="Desconectado por inactividad.",
-                                color=discord.Color.orange()))
+
+def is_busy(voice_client):
+    return voice_client is not None and (voice_client.is_playing()
+                                         or voice_client.is_paused())
 
 
-async def add_random_song_to_queue(ctx):
-    youtube_result = search_youtube("recommended song")
-    if youtube_result:
-        url = youtube_result['webpage_url']
-        title = youtube_result['title']
-        music_queue.append({'query': title, 'title': title, 'url': url})
+async def play_next(ctx):
+    # Todo lo que arranca una canción pasa por player.start_lock: sin él, un
+    # -play o una importación que llegan mientras se resuelve la siguiente
+    # intentarían reproducir a la vez
+    player = players.get(ctx.guild.id)
+    async with player.start_lock:
+        if is_busy(ctx.voice_client):
+            # Otra tarea ya arrancó una canción
+            return
+        await advance(ctx, player)
+
+
+async def advance(ctx, player):
+    # Pasa a la siguiente canción que se pueda reproducir. Se llama con
+    # player.start_lock tomado
+    ended_at, player.ended_at = player.ended_at, None
+    on_start = observer(TRANSITION_GAP, ended_at) if ended_at else None
+    while player.queue:
+        next_song = player.queue.popleft()
+        # Con copia local no hace falta resolver el stream
+        track = local_copy(Track.from_entry(next_song))
+        try:
+            if track is None:
+                # Normalmente ya está resuelta por el prefetcher
+                track = await player.prefetcher.take(next_song)
+        except (ResolverBusy, ResolverTimeout) as e:
+            if (isinstance(e, ResolverBusy)
+                    or player.retry_attempts < PLAY_RETRIES):
+                player.queue.appendleft(next_song)
+                retry_later(ctx, player, next_song)
+                return
+            logging.warning(f"No se pudo resolver {next_song['title']}: {e}")
+            player.retry_attempts = 0
+            track = None
+        if track is None or track.stream_url is None:
+            outbox.error(
+                ctx,
+                f"⚠️ No se pudo reproducir {next_song['title']}. Pasando a la siguiente..."
+            )
+            continue
+        if await start_playback(ctx, track, on_start=on_start):
+            return
+    if player.autoplay:
+        # Normalmente ya hay candidatas resueltas; solo se espera al relleno
+        # si todavía no hay ninguna
+        track = await player.autoplay_pool.next()
+        if track is not None and await start_playback(
+                ctx, track, on_start=on_start):
+            return
+        player.current = None
         await ctx.send(embed=discord.Embed(
-            description=
-            f"🔄 Añadido a la cola automáticamente: [{title}]({url})",
-            color=current_embed_color))
+            description="⚠️ Autoplay: no se encontraron canciones relacionadas.",
+            color=discord.Color.orange()))
+        idle_monitor.stopped(ctx.guild.id)
+        return
+    player.current = None
+    embed = discord.Embed(
+        title="Cola terminada 🛑",
+        description=
+        "No quedan más canciones por reproducir.\nPuedes activar -autoplay para que la cola nunca acabe.",
+        color=discord.Color.red())
+    await update_panel(ctx, player, embed, view=None)
+    idle_monitor.stopped(ctx.guild.id)
+
+
+def listener_count(channel):
+    # Sin caché de miembros channel.members está vacío: se cuentan los
+    # estados de voz del canal, sin el propio bot
+    return sum(1 for user_id in channel.voice_states if user_id != bot.user.id)
+
+
+async def reap_voice(guild_id, reason):
+    # Cierra una llamada inactiva: primero el reproductor, para que el
+    # after() de la canción no pase a la siguiente, y después la conexión,
+    # que termina el proceso ffmpeg
+    player = players.peek(guild_id)
+    panel = player.panel if player else None
+    players.remove(guild_id)
+    guild = bot.get_guild(guild_id)
+    voice_client = guild.voice_client if guild else None
+    if voice_client is None:
+        return
+    voice_client.stop()
+    await voice_client.disconnect(force=True)
+    logging.info(f"Desconectado de {guild_id} ({reason})")
+    if panel is not None:
+        description = ("Desconectado: no queda nadie en el canal."
+                       if reason == 'alone' else
+                       "Desconectado por inactividad.")
+        try:
+            await panel.channel.send(embed=discord.Embed(
+                description=description, color=discord.Color.orange()))
+        except discord.HTTPException as e:
+            logging.error(f"No se pudo avisar de la desconexión: {e}")
 
 
 class MusicControls(discord.ui.View):
+    # Una única vista persistente para todos los servidores: los custom_id
+    # son fijos, se registra una vez al arrancar (también sirve para los
+    # mensajes anteriores a un reinicio) y cada botón actúa sobre el servidor
+    # de la interacción
 
-    def __init__(self, ctx):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.ctx = ctx
 
-    @discord.ui.button(label="⏯️", style=discord.ButtonStyle.primary)
-    async def pause_resume(self, button: discord.ui.Button,
-                           interaction: discord.Interaction):
-        if self.ctx.voice_client.is_playing():
-            self.ctx.voice_client.pause()
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.guild is None or interaction.guild.voice_client is None:
+            await interaction.response.send_message(
+                "⚠️ No estoy en un canal de voz.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="⏯️",
+                       style=discord.ButtonStyle.primary,
+                       custom_id="burrito:pause_resume")
+    async def pause_resume(self, interaction: discord.Interaction,
+                           button: discord.ui.Button):
+        voice_client = interaction.guild.voice_client
+        if voice_client.is_playing():
+            voice_client.pause()
+            idle_monitor.stopped(interaction.guild.id)
             await interaction.response.send_message("⏸️ Música pausada.",
                                                     ephemeral=True)
         else:
-            self.ctx.voice_client.resume()
+            voice_client.resume()
+            idle_monitor.playing(interaction.guild.id)
             await interaction.response.send_message("▶️ Música reanudada.",
                                                     ephemeral=True)
 
-    @discord.ui.button(label="⏭️", style=discord.ButtonStyle.primary)
-    async def skip(self, button: discord.ui.Button,
-                   interaction: discord.Interaction):
-        self.ctx.voice_client.stop()
+    @discord.ui.button(label="⏭️",
+                       style=discord.ButtonStyle.primary,
+                       custom_id="burrito:skip")
+    async def skip(self, interaction: discord.Interaction,
+                   button: discord.ui.Button):
+        interaction.guild.voice_client.stop()
         await interaction.response.send_message("⏭️ Saltando canción...",
                                                 ephemeral=True)
 
-    @discord.ui.button(label="🔁", style=discord.ButtonStyle.primary)
-    async def toggle_loop(self, button: discord.ui.Button,
-                          interaction: discord.Interaction):
-        global loop
-        loop = not loop
-        status = "activado" if loop else "desactivado"
+    @discord.ui.button(label="🔁",
+                       style=discord.ButtonStyle.primary,
+                       custom_id="burrito:loop")
+    async def toggle_loop(self, interaction: discord.Interaction,
+                          button: discord.ui.Button):
+        player = players.get(interaction.guild.id)
+        player.loop = not player.loop
+        status = "activado" if player.loop else "desactivado"
         await interaction.response.send_message(f"🔁 Loop {status}.",
                                                 ephemeral=True)
 
@@ -208,6 +535,8 @@ async def join(ctx):
 @bot.command(aliases=['l'])
 async def leave(ctx):
     if ctx.voice_client:
+        # Sin reproductor, el after() de la canción no pasa a la siguiente
+        players.remove(ctx.guild.id)
         await ctx.guild.voice_client.disconnect()
         await ctx.send(
             embed=discord.Embed(description="Desconectado del canal de voz.",
@@ -219,152 +548,309 @@ async def leave(ctx):
 
 
 @bot.command(aliases=['p'])
-async def play(ctx, *, query, from_queue=False):
-    global current_song, current_song_url
-    youtube_result = search_youtube(query)
-
-    if youtube_result:
-        url = youtube_result['webpage_url']
-        title = youtube_result['title']
-        thumbnail = youtube_result.get('thumbnail', None)
-        duration = youtube_result.get('duration', None)
-    else:
+async def play(ctx, *, query):
+    requested_at = time.perf_counter()
+    player = players.get(ctx.guild.id)
+    if ctx.voice_client is None:
+        voice_channel = ctx.author.voice.channel
+        await voice_channel.connect()
+
+    if is_collection(query):
+        await import_collection(ctx, player, query)
+        return
+
+    async with player.start_lock:
+        # Con el lock, de varios -play seguidos solo el primero arranca la
+        # reproducción; el resto ve que ya suena algo y encola
+        if not is_busy(ctx.voice_client):
+            # Una única extracción con metadatos y URL directa del stream
+            track = await tracks.resolve(query)
+            if track is None or track.stream_url is None:
+                await ctx.send(embed=discord.Embed(
+                    description="⚠️ No se encontraron resultados en YouTube.",
+                    color=discord.Color.red()))
+                return
+            if not await start_playback(
+                    ctx, track, on_start=observer(PLAY_LATENCY,
+                                                  requested_at)):
+                await advance(ctx, player)
+            return
+
+    # Para encolar basta con la búsqueda ligera; el stream se resuelve
+    # cuando le toque sonar
+    track = await tracks.search(query)
+    if track is None:
         await ctx.send(embed=discord.Embed(
             description="⚠️ No se encontraron resultados en YouTube.",
             color=discord.Color.red()))
         return
+    player.enqueue(track.to_entry(query))
+    # Los avisos seguidos se envían juntos en un solo mensaje
+    outbox.queued(ctx, track)
+
+
+async def enqueue_stream(ctx, player, pages):
+    # Encola las entradas según llegan y arranca la reproducción con la
+    # primera, sin esperar al resto. 'pages' es un iterador asíncrono de
+    # listas de entradas. Se puede cancelar con -clear.
+    task = asyncio.current_task()
+    player.imports.add(task)
+    added = 0
+    try:
+        async for entries in pages:
+            for entry in entries:
+                player.enqueue(entry)
+            added += len(entries)
+            if ctx.voice_client and not is_busy(ctx.voice_client):
+                await play_next(ctx)
+    finally:
+        player.imports.discard(task)
+    return added
+
+
+async def import_collection(ctx, player, url):
+    message = await ctx.send(
+        embed=discord.Embed(description="📥 Importando canciones...",
+                            color=current_embed_color))
+    try:
+        added = await enqueue_stream(ctx, player, importer.pages(url))
+        embed = discord.Embed(
+            description=f"📥 Añadidas {added} canciones a la cola.",
+            color=current_embed_color)
+    except asyncio.CancelledError:
+        # -clear cancela la importación: se avisa y se propaga la cancelación
+        try:
+            await message.edit(embed=discord.Embed(
+                description="📥 Importación cancelada.",
+                color=discord.Color.orange()))
+        except discord.HTTPException as e:
+            logging.error(f"No se pudo avisar de la cancelación: {e}")
+        raise
+    except Exception as e:
+        logging.error(f"Error al importar {url}: {e}")
+        embed = discord.Embed(
+            description="⚠️ La importación se interrumpió.",
+            color=discord.Color.red())
+    await message.edit(embed=embed)
 
-    if ctx.voice_client is None:
-        voice_channel = ctx.author.voice.channel
-        await voice_channel.connect()
+
+def play_source(ctx, player, track, offset=0.0, on_start=None):
+    # Lanza ffmpeg para 'track' desde 'offset'. Al terminar pasa a la
+    # siguiente canción, salvo que el stream se haya cortado antes de tiempo
 
     def after_playing(error):
         if error:
             logging.error(f"Error después de reproducir: {error}")
+        player.ended_at = time.perf_counter()
+        if player.closed:
+            # Reproductor liberado (apagado o inactividad)
+            return
+        source = ctx.voice_client.source if ctx.voice_client else None
+        if isinstance(source, TrackSource) and source.interrupted(error):
+            asyncio.run_coroutine_threadsafe(resume_playback(ctx, source),
+                                             bot.loop)
+            return
         asyncio.run_coroutine_threadsafe(play_next(ctx), bot.loop)
 
-    if ctx.voice_client.is_playing() and not from_queue:
-        music_queue.append({
-            'query': query,
-            'title': title,
-            'url': url,
-            'thumbnail': thumbnail,
-            'duration': duration
-        })
+    ctx.voice_client.play(TrackSource(track,
+                                      volume=player.volume,
+                                      offset=offset,
+                                      executable=FFMPEG_PATH,
+                                      on_start=on_start),
+                          after=after_playing)
+
+
+async def resume_playback(ctx, source):
+    # Se vuelve a pedir la URL del stream (la anterior puede haber caducado)
+    # y se continúa en la posición en la que se cortó
+    player = players.get(ctx.guild.id)
+    async with player.start_lock:
+        if not is_busy(ctx.voice_client):
+            await resume_source(ctx, player, source)
+
+
+async def resume_source(ctx, player, source):
+    track = source.track
+    if source.stable:
+        player.resume_attempts = 0
+    if (ctx.voice_client is None or player.current is None
+            or player.current.id != track.id):
+        return
+    if player.resume_attempts >= STREAM_RESUME_RETRIES:
+        logging.error(f"No se pudo reanudar {track.title}")
         await ctx.send(embed=discord.Embed(
-            description=f"Añadido a la cola: [{title}]({url})",
-            color=current_embed_color))
-    else:
+            description=
+            f"⚠️ Se perdió la conexión con {track.title}. Pasando a la siguiente...",
+            color=discord.Color.red()))
+        await advance(ctx, player)
+        return
+    player.resume_attempts += 1
+    logging.warning(f"Stream cortado en {track.title} ({source.position:.0f}s), "
+                    f"reanudando (intento {player.resume_attempts})")
+    if track.stream_url.startswith(('http://', 'https://')):
         try:
-            with youtube_dl.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                URL = info['url']
-        except Exception as e:
-            logging.error(f"Error al reproducir la canción: {e}")
-            await ctx.send(embed=discord.Embed(
-                description=
-                f"⚠️ No se pudo reproducir {title}. Buscando una alternativa...",
-                color=discord.Color.red()))
-            music_queue.appendleft({
-                'query': query,
-                'title': title,
-                'url': url,
-                'thumbnail': thumbnail,
-                'duration': duration
-            })
-            await play_next(ctx)
-            return
-
-        current_song = title
-        current_song_url = url
+            fresh = await tracks.resolve(track.webpage_url, fresh=True)
+        except (ResolverBusy, ResolverTimeout):
+            fresh = None
+        if fresh is not None and fresh.stream_url:
+            track = fresh
+    player.current = track
+    player.ended_at = None
+    try:
+        play_source(ctx, player, track, offset=source.position)
+    except Exception as e:
+        logging.error(f"Error al reanudar la reproducción: {e}")
+        await advance(ctx, player)
+
+
+async def start_playback(ctx, track, on_start=None):
+    # Se llama con player.start_lock tomado. Devuelve False si la canción no
+    # se pudo reproducir
+    player = players.get(ctx.guild.id)
+
+    if audio_cache:
+        local = audio_cache.local_track(track)
+        if local:
+            track = local
+        else:
+            audio_cache.record_play(track)
+
+    try:
+        play_source(ctx, player, track, on_start=on_start)
+    except discord.ClientException as e:
+        # Ya suena otra cosa: la canción no ha fallado, vuelve a la cola
+        logging.warning(f"No se pudo iniciar {track.title}: {e}")
+        player.queue.appendleft(track.to_entry())
+        player.prefetcher.schedule(player.queue)
+        outbox.queued(ctx, track)
+        return True
+    except Exception as e:
+        logging.error(f"Error al iniciar la reproducción: {e}")
+        outbox.error(
+            ctx, f"⚠️ No se pudo iniciar la reproducción de {track.title}.")
+        return False
+
+    player.current = track
+    player.resume_attempts = 0
+    player.retry_attempts = 0
+    idle_monitor.playing(ctx.guild.id)
+    player.autoplay_pool.record(track)
+    if player.autoplay:
+        # Las candidatas se preparan mientras suena esta canción
+        player.autoplay_pool.fill()
+
+    # Mientras suena, se resuelve la siguiente de la cola
+    player.prefetcher.schedule(player.queue)
+
+    embed = discord.Embed(title="Ahora suena 🎶",
+                          description=f"[{track.title}]({track.webpage_url})",
+                          color=current_embed_color)
+    if track.duration:
+        embed.add_field(
+            name="Duración",
+            value=format_time(track.duration),
+            inline=True)
+    embed.add_field(name="En cola",
+                    value=f"{len(player.queue)} canciones",
+                    inline=True)
+    if track.thumbnail:
+        embed.set_thumbnail(url=track.thumbnail)
+    embed.set_footer(text=f"Pedido por {ctx.author.display_name}",
+                     icon_url=ctx.author.display_avatar.url)
+    await update_panel(ctx, player, embed, view=bot.controls)
+    return True
+
+
+async def update_panel(ctx, player, embed, view):
+    # Un único mensaje "Ahora suena" por servidor que se edita en cada cambio
+    # de canción; solo se envía uno nuevo si cambia el canal o se borró
+    panel = player.panel
+    if panel is not None and panel.channel.id == ctx.channel.id:
         try:
-            ctx.voice_client.play(discord.FFmpegPCMAudio(
-                URL, executable=FFMPEG_PATH),
-                                  after=after_playing)
-            ctx.voice_client.source = discord.PCMVolumeTransformer(
-                ctx.voice_client.source)  # Añadido para manejar el volumen
-            ctx.voice_client.source.volume = 0.5  # Volumen inicial
-        except Exception as e:
-            logging.error(f"Error al iniciar la reproducción: {e}")
-            await ctx.send(embed=discord.Embed(
-                description=
-                f"⚠️ No se pudo iniciar la reproducción de {title}.",
-                color=discord.Color.red()))
-            await play_next(ctx)
+            await outbox.edit(ctx, panel, embed=embed, view=view)
             return
-
-        embed = discord.Embed(title="Ahora suena 🎶",
-                              description=f"[{title}]({url})",
-                              color=current_embed_color)
-        embed.add_field(name="Duración",
-                        value=f"{duration // 60}:{duration % 60:02}",
-                        inline=True)
-        embed.add_field(name="En cola",
-                        value=f"{len(music_queue)} canciones",
-                        inline=True)
-        if thumbnail:
-            embed.set_thumbnail(url=thumbnail)
-        embed.set_footer(text=f"Pedido por {ctx.author.display_name}",
-                         icon_url=ctx.author.avatar.url)
-        view = MusicControls(ctx)
-        await ctx.send(embed=embed, view=view)
-        if not from_queue:
-            start_disconnect_timer(ctx)
+        except discord.HTTPException:
+            player.panel = None
+    kwargs = {'view': view} if view is not None else {}
+    player.panel = await outbox.send(ctx, embed=embed, **kwargs)
 
 
 # Funciones de control adicionales
 @bot.command(aliases=['lp'])
 async def loop(ctx):
-    global loop
-    loop = not loop
-    status = "activado" if loop else "desactivado"
+    player = players.get(ctx.guild.id)
+    player.loop = not player.loop
+    status = "activado" if player.loop else "desactivado"
     await ctx.send(embed=discord.Embed(description=f"🔁 Loop {status}.",
                                        color=current_embed_color))
 
 
 @bot.command(aliases=['sh'])
 async def shuffle(ctx):
-    global shuffle
-    shuffle = not shuffle
-    status = "activado" if shuffle else "desactivado"
+    player = players.get(ctx.guild.id)
+    player.shuffle = not player.shuffle
+    if player.shuffle:
+        player.queue.shuffle()
+        player.prefetcher.schedule(player.queue)
+    status = "activado" if player.shuffle else "desactivado"
     await ctx.send(embed=discord.Embed(description=f"🔀 Shuffle {status}.",
                                        color=current_embed_color))
 
 
 @bot.command(aliases=['ap'])
 async def autoplay(ctx):
-    global autoplay
-    autoplay = not autoplay
-    status = "activado" if autoplay else "desactivado"
+    player = players.get(ctx.guild.id)
+    player.autoplay = not player.autoplay
+    if player.autoplay:
+        player.autoplay_pool.fill()
+    else:
+        player.autoplay_pool.cancel()
+    status = "activado" if player.autoplay else "desactivado"
     await ctx.send(embed=discord.Embed(description=f"🔄 Autoplay {status}.",
                                        color=current_embed_color))
 
 
 @bot.command(aliases=['sp'])
 async def save_playlist(ctx, *, name):
-    global playlists, music_queue, current_song, current_song_url
-    playlists[name] = list(music_queue)
-    if current_song:
-        playlists[name].insert(0, {
-            'query': current_song,
-            'title': current_song,
-            'url': current_song_url
-        })
+    player = players.get(ctx.guild.id)
+    entries = list(player.queue)
+    if player.current:
+        entries.insert(0, player.current.to_entry())
+    await playlist_store.run(playlist_store.save, ctx.guild.id, name, entries)
     await ctx.send(
         embed=discord.Embed(description=f"💾 Playlist '{name}' guardada.",
                             color=current_embed_color))
 
 
+async def playlist_pages(guild_id, name):
+    # Lee la playlist por lotes; las entradas ya traen la URL resuelta
+    after = -1
+    while True:
+        rows = await playlist_store.run(playlist_store.entries, guild_id,
+                                        name, after, PLAYLIST_LOAD_BATCH)
+        if not rows:
+            return
+        after = rows[-1][0]
+        yield [entry for _, entry in rows]
+
+
 @bot.command(aliases=['lpl'])
 async def load_playlist(ctx, *, name):
-    global playlists, music_queue
-    if name in playlists:
-        music_queue = deque(playlists[name])
+    player = players.get(ctx.guild.id)
+    if await playlist_store.run(playlist_store.exists, ctx.guild.id, name):
+        if ctx.voice_client is None and ctx.author.voice:
+            await ctx.author.voice.channel.connect()
+        player.cancel_imports()
+        player.queue.clear()
+        player.prefetcher.cancel()
         await ctx.send(
-            embed=discord.Embed(description=f"📂 Playlist '{name}' cargada.",
+            embed=discord.Embed(description=f"📂 Cargando playlist '{name}'...",
                                 color=current_embed_color))
-        if not ctx.voice_client.is_playing():
-            await play_next(ctx)
+        added = await enqueue_stream(ctx, player,
+                                     playlist_pages(ctx.guild.id, name))
+        await ctx.send(embed=discord.Embed(
+            description=f"📂 Playlist '{name}' cargada ({added} canciones).",
+            color=current_embed_color))
     else:
         await ctx.send(embed=discord.Embed(
             description=f"⚠️ Playlist '{name}' no encontrada.",
@@ -373,9 +859,7 @@ async def load_playlist(ctx, *, name):
 
 @bot.command(aliases=['dp'])
 async def delete_playlist(ctx, *, name):
-    global playlists
-    if name in playlists:
-        del playlists[name]
+    if await playlist_store.run(playlist_store.delete, ctx.guild.id, name):
         await ctx.send(
             embed=discord.Embed(description=f"🗑️ Playlist '{name}' eliminada.",
                                 color=current_embed_color))
@@ -385,34 +869,36 @@ async def delete_playlist(ctx, *, name):
             color=discord.Color.red()))
 
 
-@bot.command(aliases=['vp'])
-async def view_playlists(ctx):
-    if playlists:
-        playlist_names = "\n".join(playlists.keys())
-        message = await ctx.send(
-            embed=discord.Embed(title="📋 Playlists guardadas",
-                                description=playlist_names,
-                                color=current_embed_color))
-        await message.add_reaction("🗑️")
+async def render_playlists_page(guild_id, page):
+    # Solo se leen de la base de datos los nombres de la página visible
+    total = await playlist_store.run(playlist_store.count, guild_id)
+    pages = max(1, -(-total // PLAYLISTS_PAGE_SIZE))
+    page = max(1, min(page, pages))
+    names = await playlist_store.run(playlist_store.names, guild_id,
+                                     (page - 1) * PLAYLISTS_PAGE_SIZE,
+                                     PLAYLISTS_PAGE_SIZE)
+    embed = discord.Embed(title="📋 Playlists guardadas",
+                          description="\n".join(names),
+                          color=current_embed_color)
+    embed.set_footer(
+        text=f"Página {page}/{pages} · Para eliminar una playlist, usa "
+        "-delete_playlist <nombre>")
+    return embed, page, pages
 
-        def check(reaction, user):
-            return user == ctx.author and str(reaction.emoji) == "🗑️"
 
-        try:
-            reaction, user = await bot.wait_for("reaction_add",
-                                                timeout=60.0,
-                                                check=check)
-            if str(reaction.emoji) == "🗑️":
-                await ctx.send(embed=discord.Embed(
-                    description=
-                    "Para eliminar una playlist, usa el comando `-delete_playlist <nombre>`",
-                    color=discord.Color.orange()))
-        except asyncio.TimeoutError:
-            pass
-    else:
+@bot.command(aliases=['vp'])
+async def view_playlists(ctx, page: int = 1):
+    embed, page, pages = await render_playlists_page(ctx.guild.id, page)
+    if not embed.description:
         await ctx.send(
             embed=discord.Embed(description="⚠️ No hay playlists guardadas.",
                                 color=discord.Color.orange()))
+        return
+    message = await ctx.send(embed=embed)
+    if pages > 1:
+        await paginate(
+            ctx, message, page,
+            lambda page: render_playlists_page(ctx.guild.id, page))
 
 
 @bot.command(aliases=['s'])
@@ -430,31 +916,84 @@ async def skip(ctx):
 
 @bot.command(aliases=['np'])
 async def nowplaying(ctx):
-    if current_song:
-        await ctx.send(embed=discord.Embed(
-            description=
-            f"🎵 Reproduciendo actualmente: [{current_song}]({current_song_url})",
-            color=current_embed_color))
+    current = players.get(ctx.guild.id).current
+    if current:
+        description = f"🎵 Reproduciendo actualmente: [{current.title}]({current.webpage_url})"
+        position = current_position(ctx.voice_client)
+        if position is not None:
+            progress = format_time(position)
+            if current.duration:
+                progress += f" / {format_time(current.duration)}"
+            if ctx.voice_client.is_paused():
+                progress += " (en pausa)"
+            description += f"\n`{progress}`"
+        await ctx.send(embed=discord.Embed(description=description,
+                                           color=current_embed_color))
     else:
         await ctx.send(embed=discord.Embed(
             description="⚠️ No hay ninguna canción reproduciéndose.",
             color=discord.Color.orange()))
 
 
+async def render_queue_page(player, page):
+    # Solo se formatean las entradas de la página visible
+    pages = max(1, -(-len(player.queue) // QUEUE_PAGE_SIZE))
+    page = max(1, min(page, pages))
+    start = (page - 1) * QUEUE_PAGE_SIZE
+    lines = []
+    for offset, (_, song) in enumerate(
+            player.queue.page(start, QUEUE_PAGE_SIZE)):
+        title = song['title']
+        if len(title) > 80:
+            title = title[:77] + "..."
+        lines.append(f"{start + offset + 1}. [{title}]({song['url']})")
+    embed = discord.Embed(title="📃 Cola de Reproducción",
+                          description="\n" + "\n".join(lines),
+                          color=current_embed_color)
+    embed.set_footer(
+        text=f"Página {page}/{pages} · {len(player.queue)} canciones")
+    return embed, page, pages
+
+
 @bot.command(aliases=['q'])
-async def queue(ctx):
-    if music_queue:
-        queue_list = "\n" + "\n".join([
-            f"{idx + 1}. [{song['title']}]({song['url']})"
-            for idx, song in enumerate(music_queue)
-        ])
-        await ctx.send(embed=discord.Embed(title="📃 Cola de Reproducción",
-                                           description=queue_list,
-                                           color=current_embed_color))
-    else:
+async def queue(ctx, page: int = 1):
+    player = players.get(ctx.guild.id)
+    if not player.queue:
         await ctx.send(embed=discord.Embed(
             description="⚠️ La cola de reproducción está vacía.",
             color=discord.Color.orange()))
+        return
+
+    embed, page, pages = await render_queue_page(player, page)
+    message = await ctx.send(embed=embed)
+    if pages > 1:
+        await paginate(ctx, message, page,
+                       lambda page: render_queue_page(player, page))
+
+
+async def paginate(ctx, message, page, render):
+    # Navegación con reacciones; render(page) -> (embed, page, pages)
+    await message.add_reaction("⬅️")
+    await message.add_reaction("➡️")
+
+    def check(reaction, user):
+        return (user == ctx.author and reaction.message.id == message.id
+                and str(reaction.emoji) in ["⬅️", "➡️"])
+
+    while True:
+        try:
+            reaction, user = await bot.wait_for("reaction_add",
+                                                timeout=60.0,
+                                                check=check)
+        except asyncio.TimeoutError:
+            break
+        page += -1 if str(reaction.emoji) == "⬅️" else 1
+        embed, page, _ = await render(page)
+        await message.edit(embed=embed)
+        try:
+            await message.remove_reaction(reaction.emoji, user)
+        except discord.HTTPException:
+            pass
 
 
 @bot.command(aliases=['v'])
@@ -464,7 +1003,10 @@ async def volume(ctx, volume: int):
             embed=discord.Embed(description="⚠️ No estoy en un canal de voz.",
                                 color=discord.Color.red()))
     if 0 <= volume <= 100:
-        ctx.voice_client.source.volume = volume / 100
+        player = players.get(ctx.guild.id)
+        player.volume = volume / 100
+        # El volumen lo aplica ffmpeg: se reinicia en la posición actual
+        restart_source(ctx.voice_client, volume=player.volume)
         await ctx.send(
             embed=discord.Embed(description=f"🔊 Volumen ajustado a {volume}%",
                                 color=current_embed_color))
@@ -475,10 +1017,64 @@ async def volume(ctx, volume: int):
             color=discord.Color.red()))
 
 
+async def seek_to(ctx, offset):
+    # Reinicia ffmpeg en 'offset' con la URL ya resuelta: no se repite la
+    # búsqueda, solo se lanza un ffmpeg nuevo
+    player = players.get(ctx.guild.id)
+    track = player.current
+    if track is None or current_position(ctx.voice_client) is None:
+        await ctx.send(embed=discord.Embed(
+            description="⚠️ No hay ninguna canción reproduciéndose.",
+            color=discord.Color.orange()))
+        return
+    offset = max(0.0, offset)
+    if track.duration and offset >= track.duration:
+        await ctx.send(embed=discord.Embed(
+            description=f"⚠️ La canción dura {format_time(track.duration)}.",
+            color=discord.Color.red()))
+        return
+    fresh = None
+    if track.expired and track.stream_url.startswith(('http://', 'https://')):
+        # La URL caducó mientras sonaba: hay que pedir otra
+        fresh = await tracks.resolve(track.webpage_url)
+        if fresh is None or fresh.stream_url is None:
+            fresh = None
+        else:
+            player.current = fresh
+    restart_source(ctx.voice_client, offset=offset, track=fresh)
+    await ctx.send(
+        embed=discord.Embed(description=f"⏩ Saltando a {format_time(offset)}.",
+                            color=current_embed_color))
+
+
+@bot.command(aliases=['sk'])
+async def seek(ctx, position):
+    try:
+        offset = parse_time(position)
+    except ValueError:
+        await ctx.send(embed=discord.Embed(
+            description="⚠️ Indica la posición en segundos o como m:ss, por ejemplo `-seek 1:30`.",
+            color=discord.Color.red()))
+        return
+    await seek_to(ctx, offset)
+
+
+@bot.command(aliases=['ff'])
+async def forward(ctx, seconds: int = 10):
+    await seek_to(ctx, (current_position(ctx.voice_client) or 0) + seconds)
+
+
+@bot.command(aliases=['rw'])
+async def rewind(ctx, seconds: int = 10):
+    await seek_to(ctx, (current_position(ctx.voice_client) or 0) - seconds)
+
+
 @bot.command(aliases=['rm'])
 async def remove(ctx, index: int):
-    if 0 <= index - 1 < len(music_queue):
-        removed_song = music_queue.pop(index - 1)
+    player = players.get(ctx.guild.id)
+    if 0 <= index - 1 < len(player.queue):
+        removed_song = player.queue.pop(index - 1)
+        player.prefetcher.schedule(player.queue)
         await ctx.send(embed=discord.Embed(
             description=f"❌ Eliminado de la cola: {removed_song['title']}",
             color=current_embed_color))
@@ -490,8 +1086,10 @@ async def remove(ctx, index: int):
 
 @bot.command(aliases=['clr'])
 async def clear(ctx):
-    global music_queue
-    music_queue.clear()
+    player = players.get(ctx.guild.id)
+    player.cancel_imports()
+    player.queue.clear()
+    player.prefetcher.cancel()
     await ctx.send(embed=discord.Embed(
         description="🧹 La cola de reproducción ha sido limpiada.",
         color=current_embed_color))
@@ -499,11 +1097,11 @@ async def clear(ctx):
 
 @bot.command(aliases=['mv'])
 async def move(ctx, from_index: int, to_index: int):
-    if 0 <= from_index - 1 < len(music_queue) and 0 <= to_index - 1 < len(
-            music_queue):
-        song = music_queue[from_index - 1]
-        music_queue.remove(song)
-        music_queue.insert(to_index - 1, song)
+    player = players.get(ctx.guild.id)
+    if 0 <= from_index - 1 < len(player.queue) and 0 <= to_index - 1 < len(
+            player.queue):
+        song = player.queue.move(from_index - 1, to_index - 1)
+        player.prefetcher.schedule(player.queue)
         message = await ctx.send(embed=discord.Embed(
             description=
             f"🔀 Movido {song['title']} de la posición {from_index} a la {to_index}.",
@@ -523,7 +1121,7 @@ async def move(ctx, from_index: int, to_index: int):
                 if to_index - 1 > 0:
                     await move(ctx, from_index=to_index, to_index=to_index - 1)
             elif str(reaction.emoji) == "⬇️":
-                if to_index < len(music_queue):
+                if to_index < len(player.queue):
                     await move(ctx, from_index=to_index, to_index=to_index + 1)
         except asyncio.TimeoutError:
             await ctx.send(embed=discord.Embed(
@@ -537,16 +1135,42 @@ async def move(ctx, from_index: int, to_index: int):
                                 color=discord.Color.red()))
 
 
+@bot.command(aliases=['cs'])
+async def cache(ctx):
+    stats = track_cache.stats()
+    embed = discord.Embed(title="🗄️ Caché de canciones",
+                          color=current_embed_color)
+    embed.add_field(
+        name="Búsquedas",
+        value=
+        f"{stats['query_hits']} aciertos / {stats['query_misses']} fallos "
+        f"({stats['query_hit_rate']:.0%})",
+        inline=False)
+    embed.add_field(
+        name="Streams",
+        value=
+        f"{stats['stream_hits']} aciertos / {stats['stream_misses']} fallos "
+        f"({stats['stream_hit_rate']:.0%})",
+        inline=False)
+    embed.add_field(name="Entradas",
+                    value=f"{stats['queries']} búsquedas, {stats['tracks']} canciones",
+                    inline=False)
+    await ctx.send(embed=embed)
+
+
 @bot.command(aliases=['cmds'])
 async def comandos(ctx):
     commands_list = """
     **Comandos Disponibles:**
     `-join (j)`: Une el bot al canal de voz.
     `-leave (l)`: Desconecta el bot del canal de voz.
-    `-play (p) <canción>`: Reproduce una canción o añade una canción a la cola.
+    `-play (p) <canción|playlist>`: Reproduce una canción o añade una canción a la cola. Acepta playlists de YouTube y playlists, álbumes o artistas de Spotify.
     `-skip (s)`: Salta a la siguiente canción en la cola.
-    `-nowplaying (np)`: Muestra la canción que se está reproduciendo actualmente.
-    `-queue (q)`: Muestra la cola de reproducción.
+    `-nowplaying (np)`: Muestra la canción que se está reproduciendo actualmente y su posición.
+    `-seek (sk) <posición>`: Salta a una posición de la canción actual (segundos o m:ss).
+    `-forward (ff) [segundos]`: Avanza la canción actual (10 segundos por defecto).
+    `-rewind (rw) [segundos]`: Retrocede la canción actual (10 segundos por defecto).
+    `-queue (q) [página]`: Muestra la cola de reproducción.
     `-volume (v) <0-100>`: Ajusta el volumen de la reproducción.
     `-remove (rm) <número>`: Elimina una canción específica de la cola.
     `-clear (clr)`: Limpia toda la cola de reproducción.
@@ -557,14 +1181,20 @@ async def comandos(ctx):
     `-save_playlist (sp) <nombre>`: Guarda la cola actual como una playlist.
     `-load_playlist (lpl) <nombre>`: Carga una playlist guardada.
     `-delete_playlist (dp) <nombre>`: Elimina una playlist guardada.
-    `-view_playlists (vp)`: Muestra todas las playlists guardadas.
+    `-view_playlists (vp) [página]`: Muestra las playlists guardadas.
+    `-cache (cs)`: Muestra las estadísticas de la caché de canciones.
     `-comandos (cmds)`: Muestra esta lista de comandos.
     """
     await ctx.send(embed=discord.Embed(description=commands_list,
                                        color=current_embed_color))
 
 
-keep_alive.keep_alive()
-
-# Ejecuta el bot con tu token desde variables de entorno
-bot.run(os.getenv('DISCORD_TOKEN'))
+# Ejecuta el bot con tu token desde variables de entorno. Importar el
+# módulo (p. ej. desde benchmark.py) no arranca el bot
+if __name__ == "__main__":
+    bot.run(os.getenv('DISCORD_TOKEN'))
+    resolver.shutdown()
+    track_cache.close()
+    playlist_store.close()
+    if audio_cache:
+        audio_cache.close()
@@ -0,0 +1,183 @@
+import os
+import time
+import bisect
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# Retardo máximo del event loop antes de que /health falle
+HEALTH_MAX_LOOP_LAG = float(os.getenv('HEALTH_MAX_LOOP_LAG', '5'))
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace(
+        '\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{_escape(value)}"'
+                     for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    # Histograma acumulado al estilo Prometheus; observe() es seguro desde
+    # cualquier hilo (p. ej. el hilo de audio de discord.py)
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def render(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'), ), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(float(bound))}"}} '
+                         f'{cumulative}')
+        lines.append(f'{self.name}_sum {total}')
+        lines.append(f'{self.name}_count {cumulative}')
+        return lines
+
+
+class Gauge:
+    # El valor se calcula al servir /metrics. 'collect' devuelve un número o
+    # una lista de (etiquetas, valor)
+
+    def __init__(self, name, documentation, collect):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} gauge',
+        ]
+        value = self.collect()
+        samples = value if isinstance(value, list) else [({}, value)]
+        for labels, sample in samples:
+            lines.append(
+                f'{self.name}{_format_labels(labels)} {_format_value(sample)}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, buckets)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, collect):
+        metric = Gauge(name, documentation, collect)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # Una métrica rota no debe tumbar el endpoint entero
+                continue
+        return '\n'.join(lines) + '\n'
+
+
+class LoopMonitor:
+    # Mide el retardo del event loop con un sleep periódico. Si el loop está
+    # bloqueado el tick no llega, así que el retardo también se estima desde
+    # fuera comparando con la hora del último tick.
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.last_tick = None
+        self.task = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self.lag = max(0.0, now - start - self.interval)
+            self.last_tick = now
+
+    @property
+    def started(self):
+        return self.last_tick is not None
+
+    def current_lag(self):
+        if self.last_tick is None:
+            return 0.0
+        stalled = time.monotonic() - self.last_tick - self.interval
+        return max(self.lag, stalled, 0.0)
+
+    def healthy(self, threshold=HEALTH_MAX_LOOP_LAG):
+        return self.current_lag() <= threshold
+
+
+def observer(histogram, start):
+    # Callback que registra el tiempo transcurrido desde 'start'
+    # (time.perf_counter)
+    return lambda: histogram.observe(time.perf_counter() - start)
+
+
+REGISTRY = Registry()
+loop_monitor = LoopMonitor()
+
+SEARCH_LATENCY = REGISTRY.histogram(
+    'burrito_search_seconds', 'Latencia de las búsquedas (YouTube/Spotify)')
+STREAM_LATENCY = REGISTRY.histogram(
+    'burrito_stream_extraction_seconds',
+    'Latencia de la extracción de la URL del stream')
+PLAY_LATENCY = REGISTRY.histogram(
+    'burrito_play_to_audio_seconds',
+    'Tiempo desde -play hasta el primer paquete de audio')
+TRANSITION_GAP = REGISTRY.histogram(
+    'burrito_transition_gap_seconds',
+    'Silencio entre el final de una canción y el inicio de la siguiente')
+REGISTRY.gauge('burrito_event_loop_lag_seconds',
+               'Retardo actual del event loop del bot',
+               loop_monitor.current_lag)
@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+import discord
+
+# Segundos durante los que se agrupan los avisos de un canal
+OUTBOX_WINDOW = float(os.getenv('OUTBOX_WINDOW', '1.5'))
+
+# Discord limita los mensajes por canal (unos 5 cada 5 segundos); por
+# encima de eso responde 429 y discord.py reintenta tras esperar
+CHANNEL_RATE = 5
+CHANNEL_PERIOD = 5.0
+
+# Líneas que se listan en un resumen; el resto se cuenta
+SUMMARY_LINES = 10
+
+
+class RateLimiter:
+    # Ventana deslizante: como mucho 'rate' envíos cada 'period' segundos
+
+    def __init__(self, rate=CHANNEL_RATE, period=CHANNEL_PERIOD):
+        self.rate = rate
+        self.period = period
+        self.sent = deque()
+
+    def _prune(self, now):
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+
+    def delay(self):
+        now = time.monotonic()
+        self._prune(now)
+        if len(self.sent) < self.rate:
+            return 0.0
+        return self.sent[0] + self.period - now
+
+    @property
+    def idle(self):
+        self._prune(time.monotonic())
+        return not self.sent
+
+    async def wait(self):
+        while (delay := self.delay()) > 0:
+            await asyncio.sleep(delay)
+        self.sent.append(time.monotonic())
+
+
+class ChannelOutbox:
+
+    def __init__(self):
+        self.limiter = RateLimiter()
+        self.queued = []  # Líneas "Añadido a la cola"
+        self.errors = []
+        self.target = None  # ctx con el que se envía el resumen
+        self.task = None
+
+
+class Outbox:
+    # Mensajes salientes del bot por canal. Los avisos de "Añadido a la
+    # cola" y los errores de reproducción se agrupan durante OUTBOX_WINDOW
+    # en un único embed, y todos los envíos respetan el límite del canal:
+    # mientras se espera turno se siguen acumulando avisos en el mismo lote.
+
+    def __init__(self, color, window=OUTBOX_WINDOW):
+        self.color = color
+        self.window = window
+        self.channels = {}
+
+    def _channel(self, ctx):
+        channel_id = ctx.channel.id
+        outbox = self.channels.get(channel_id)
+        if outbox is None:
+            # Se olvidan los canales sin envíos recientes ni avisos pendientes
+            for key in [
+                    key for key, item in self.channels.items()
+                    if item.task is None and item.limiter.idle
+            ]:
+                del self.channels[key]
+            outbox = self.channels[channel_id] = ChannelOutbox()
+        return outbox
+
+    async def send(self, ctx, **kwargs):
+        await self._channel(ctx).limiter.wait()
+        return await ctx.send(**kwargs)
+
+    async def edit(self, ctx, message, **kwargs):
+        await self._channel(ctx).limiter.wait()
+        await message.edit(**kwargs)
+        return message
+
+    def queued(self, ctx, track):
+        self._add(ctx, 'queued', f"[{track.title}]({track.webpage_url})")
+
+    def error(self, ctx, text):
+        self._add(ctx, 'errors', text)
+
+    def _add(self, ctx, kind, line):
+        outbox = self._channel(ctx)
+        getattr(outbox, kind).append(line)
+        outbox.target = ctx
+        if outbox.task is None:
+            outbox.task = asyncio.ensure_future(self._flush(outbox))
+
+    async def _flush(self, outbox):
+        try:
+            await asyncio.sleep(self.window)
+            await outbox.limiter.wait()
+        finally:
+            outbox.task = None
+        queued, outbox.queued = outbox.queued, []
+        errors, outbox.errors = outbox.errors, []
+        try:
+            if queued:
+                await outbox.target.send(embed=self._queued_embed(queued))
+            if errors:
+                if queued:
+                    await outbox.limiter.wait()
+                await outbox.target.send(embed=discord.Embed(
+                    description=self._lines(errors),
+                    color=discord.Color.red()))
+        except discord.HTTPException as e:
+            logging.error(f"No se pudo enviar el resumen: {e}")
+
+    def _lines(self, lines):
+        text = "\n".join(lines[:SUMMARY_LINES])
+        if len(lines) > SUMMARY_LINES:
+            text += f"\n... y {len(lines) - SUMMARY_LINES} más"
+        return text
+
+    def _queued_embed(self, lines):
+        if len(lines) == 1:
+            return discord.Embed(description=f"Añadido a la cola: {lines[0]}",
+                                 color=self.color)
+        return discord.Embed(title=f"Añadidas {len(lines)} canciones a la cola",
+                             description=self._lines(lines),
+                             color=self.color)
+
+    def cancel(self):
+        for outbox in self.channels.values():
+            if outbox.task is not None:
+                outbox.task.cancel()
+        self.channels.clear()
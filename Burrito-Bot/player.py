@@ -0,0 +1,105 @@
+import os
+import time
+import random
+import asyncio
+from prefetch import Prefetcher
+from autoplay import AutoplayPool
+from track_queue import TrackQueue
+
+# Tiempo sin actividad tras el cual se libera el estado de un servidor
+PLAYER_IDLE_TTL = float(os.getenv('PLAYER_IDLE_TTL', '1800'))
+
+# Volumen inicial (%). Al 100% las pistas Opus se reproducen sin recodificar
+DEFAULT_VOLUME = int(os.getenv('DEFAULT_VOLUME', '100'))
+
+
+class GuildPlayer:
+    # Estado de reproducción de un único servidor
+
+    def __init__(self, guild_id, tracks, recommender):
+        self.guild_id = guild_id
+        self.queue = TrackQueue()
+        self.current = None  # Track que está sonando
+        self.panel = None  # Mensaje "Ahora suena" que se edita en cada canción
+        self.prefetcher = Prefetcher(tracks)
+        # Historial y candidatas ya resueltas para el autoplay
+        self.autoplay_pool = AutoplayPool(recommender)
+        self.imports = set()  # Importaciones de playlists en curso
+        # Serializa la decisión de arrancar una canción o encolarla
+        self.start_lock = asyncio.Lock()
+        self.loop = False
+        self.shuffle = False
+        self.autoplay = False
+        self.volume = DEFAULT_VOLUME / 100
+        self.ended_at = None  # Fin de la última canción (perf_counter)
+        self.resume_attempts = 0  # Reanudaciones seguidas tras un corte
+        self.retry_attempts = 0  # Reintentos seguidos con el pool saturado
+        self.closed = False
+        self.last_active = time.monotonic()
+
+    def enqueue(self, entry):
+        # Con shuffle activo las nuevas entradas caen en una posición al azar
+        if self.shuffle:
+            self.queue.insert(random.randint(0, len(self.queue)), entry)
+        else:
+            self.queue.append(entry)
+        self.prefetcher.schedule(self.queue)
+
+    def cancel_imports(self):
+        for task in self.imports:
+            task.cancel()
+        self.imports.clear()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_active
+
+    def close(self):
+        self.closed = True
+        self.prefetcher.cancel()
+        self.autoplay_pool.cancel()
+        self.cancel_imports()
+        self.queue.clear()
+        self.current = None
+        self.panel = None
+
+
+class PlayerManager:
+    # Crea los GuildPlayer bajo demanda y libera los inactivos
+
+    def __init__(self, tracks, recommender, idle_ttl=PLAYER_IDLE_TTL):
+        self.tracks = tracks
+        self.recommender = recommender
+        self.idle_ttl = idle_ttl
+        self.players = {}
+
+    def get(self, guild_id):
+        player = self.players.get(guild_id)
+        if player is None:
+            player = self.players[guild_id] = GuildPlayer(guild_id, self.tracks,
+                                                        self.recommender)
+        player.touch()
+        return player
+
+    def peek(self, guild_id):
+        return self.players.get(guild_id)
+
+    def remove(self, guild_id):
+        player = self.players.pop(guild_id, None)
+        if player:
+            player.close()
+
+    def evict_idle(self, is_connected):
+        # is_connected(guild_id) -> True si el bot sigue en un canal de voz
+        evicted = [
+            guild_id for guild_id, player in self.players.items()
+            if player.idle_for() > self.idle_ttl and not is_connected(guild_id)
+        ]
+        for guild_id in evicted:
+            self.remove(guild_id)
+        return len(evicted)
+
+    def __len__(self):
+        return len(self.players)
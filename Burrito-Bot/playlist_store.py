@@ -0,0 +1,120 @@
+import os
+import time
+import sqlite3
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Ruta de la base de datos de playlists guardadas
+PLAYLIST_DB_PATH = os.getenv('PLAYLIST_DB_PATH', 'playlists.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (guild_id, name)
+);
+CREATE TABLE IF NOT EXISTS playlist_entries (
+    playlist_id INTEGER NOT NULL
+        REFERENCES playlists (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    video_id TEXT,
+    query TEXT NOT NULL,
+    title TEXT,
+    url TEXT,
+    thumbnail TEXT,
+    duration INTEGER,
+    PRIMARY KEY (playlist_id, position)
+) WITHOUT ROWID;
+"""
+
+ENTRY_FIELDS = ('id', 'query', 'title', 'url', 'thumbnail', 'duration')
+
+
+class PlaylistStore:
+    # Playlists por servidor en SQLite. Las entradas guardan el id de vídeo y
+    # la URL ya resueltos, así que al cargarlas no se vuelve a buscar nada.
+    # Los métodos son bloqueantes: desde el event loop se llaman con run(),
+    # en un hilo propio, para no competir con yt-dlp por el pool del
+    # resolver ni quedar fuera por su límite de trabajos pendientes.
+
+    def __init__(self, path=PLAYLIST_DB_PATH):
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='playlists')
+        with self.lock:
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA foreign_keys=ON')
+            self.db.executescript(SCHEMA)
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+                                          functools.partial(func, *args))
+
+    def _playlist_id(self, guild_id, name):
+        row = self.db.execute(
+            'SELECT id FROM playlists WHERE guild_id = ? AND name = ?',
+            (guild_id, name)).fetchone()
+        return row[0] if row else None
+
+    def save(self, guild_id, name, entries):
+        with self.lock, self.db:
+            self.db.execute(
+                'DELETE FROM playlists WHERE guild_id = ? AND name = ?',
+                (guild_id, name))
+            playlist_id = self.db.execute(
+                'INSERT INTO playlists (guild_id, name, created_at) '
+                'VALUES (?, ?, ?)', (guild_id, name, time.time())).lastrowid
+            self.db.executemany(
+                'INSERT INTO playlist_entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                ((playlist_id, position,
+                  *(entry.get(field) for field in ENTRY_FIELDS))
+                 for position, entry in enumerate(entries)))
+
+    def exists(self, guild_id, name):
+        with self.lock:
+            return self._playlist_id(guild_id, name) is not None
+
+    def entries(self, guild_id, name, after=-1, limit=100):
+        # Paginación por clave: las entradas con posición mayor que 'after'
+        with self.lock:
+            playlist_id = self._playlist_id(guild_id, name)
+            if playlist_id is None:
+                return []
+            rows = self.db.execute(
+                'SELECT position, video_id, query, title, url, thumbnail, '
+                'duration FROM playlist_entries WHERE playlist_id = ? '
+                'AND position > ? ORDER BY position LIMIT ?',
+                (playlist_id, after, limit)).fetchall()
+        return [(row[0], dict(zip(ENTRY_FIELDS, row[1:]))) for row in rows]
+
+    def delete(self, guild_id, name):
+        with self.lock, self.db:
+            cursor = self.db.execute(
+                'DELETE FROM playlists WHERE guild_id = ? AND name = ?',
+                (guild_id, name))
+            return cursor.rowcount > 0
+
+    def names(self, guild_id, offset=0, limit=10):
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT name FROM playlists WHERE guild_id = ? '
+                'ORDER BY name LIMIT ? OFFSET ?',
+                (guild_id, limit, offset)).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self, guild_id):
+        with self.lock:
+            return self.db.execute(
+                'SELECT COUNT(*) FROM playlists WHERE guild_id = ?',
+                (guild_id, )).fetchone()[0]
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            self.db.close()
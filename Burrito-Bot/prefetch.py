@@ -0,0 +1,59 @@
+import os
+import asyncio
+import logging
+
+# Número de entradas de la cola que se resuelven por adelantado
+PREFETCH_DEPTH = int(os.getenv('PREFETCH_DEPTH', '1'))
+
+
+def entry_key(entry):
+    # Con la URL de la página evitamos repetir la búsqueda
+    return entry.get('url') or entry['query']
+
+
+class Prefetcher:
+    # Resuelve en segundo plano el stream de las próximas canciones mientras
+    # suena la actual, para que play_next arranque sin esperar a yt-dlp.
+
+    def __init__(self, tracks, depth=PREFETCH_DEPTH):
+        self.tracks = tracks
+        self.depth = depth
+        self.tasks = {}
+
+    def schedule(self, queue):
+        wanted = []
+        for entry in queue:
+            if len(wanted) >= self.depth:
+                break
+            wanted.append(entry_key(entry))
+        # Cancela lo que ya no está al principio de la cola
+        for key in list(self.tasks):
+            if key not in wanted:
+                self.tasks.pop(key).cancel()
+        for key in wanted:
+            if key not in self.tasks:
+                self.tasks[key] = asyncio.ensure_future(self._resolve(key))
+
+    async def _resolve(self, key):
+        try:
+            return await self.tracks.resolve(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.warning(f"No se pudo precargar {key}: {e}")
+            return None
+
+    async def take(self, entry):
+        key = entry_key(entry)
+        task = self.tasks.pop(key, None)
+        if task is not None and not task.cancelled():
+            track = await task
+            if track is not None and not track.expired:
+                return track
+        # Sin precarga o con la URL caducada: se resuelve ahora
+        return await self.tracks.resolve(key)
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
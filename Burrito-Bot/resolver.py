@@ -0,0 +1,196 @@
+import os
+import asyncio
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tracks import search_track, resolve_track, youtube_id, is_url
+from cache import normalize_query
+from metrics import SEARCH_LATENCY, STREAM_LATENCY
+
+# Límites del pool de resolución (yt-dlp / Spotify)
+RESOLVER_WORKERS = int(os.getenv('RESOLVER_WORKERS', '4'))
+RESOLVER_MAX_PENDING = int(os.getenv('RESOLVER_MAX_PENDING', '32'))
+RESOLVER_TIMEOUT = float(os.getenv('RESOLVER_TIMEOUT', '20'))
+
+
+class ResolverBusy(Exception):
+    pass
+
+
+class ResolverTimeout(Exception):
+    pass
+
+
+class Resolver:
+    # Ejecuta llamadas bloqueantes fuera del event loop, con un número
+    # máximo de trabajos pendientes y un timeout por llamada.
+
+    def __init__(self,
+                 workers=RESOLVER_WORKERS,
+                 max_pending=RESOLVER_MAX_PENDING,
+                 timeout=RESOLVER_TIMEOUT):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='resolver')
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+
+    def _release(self):
+        self.pending -= 1
+
+    async def run(self, func, *args, timeout=None, **kwargs):
+        if self.pending >= self.max_pending:
+            raise ResolverBusy(
+                f"{self.pending} resoluciones pendientes (máx. {self.max_pending})")
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            job = self.executor.submit(functools.partial(func, *args, **kwargs))
+        except RuntimeError:
+            self.pending -= 1
+            raise
+        # El contador se libera cuando el hilo termina de verdad (o cuando el
+        # trabajo se cancela antes de empezar), no cuando el llamador se rinde.
+        job.add_done_callback(
+            lambda _: _call_soon_threadsafe(loop, self._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(job),
+                                          timeout or self.timeout)
+        except asyncio.TimeoutError as e:
+            logging.warning(f"Timeout en {getattr(func, '__name__', func)}")
+            raise ResolverTimeout(
+                f"{getattr(func, '__name__', func)} superó "
+                f"{timeout or self.timeout}s") from e
+
+    async def run_on_each_worker(self, func):
+        # Ejecuta func una vez en cada hilo del pool (p. ej. para precalentar
+        # las instancias por hilo). La barrera obliga a que cada trabajo
+        # ocupe un hilo distinto.
+        barrier = threading.Barrier(self.workers)
+
+        def job():
+            try:
+                func()
+            finally:
+                try:
+                    barrier.wait(timeout=30)
+                except threading.BrokenBarrierError:
+                    pass
+
+        await asyncio.gather(*(asyncio.wrap_future(self.executor.submit(job))
+                               for _ in range(self.workers)))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SingleFlight:
+    # Agrupa las llamadas concurrentes con la misma clave en una sola tarea.
+    # Todos los que esperan reciben el mismo resultado o la misma excepción;
+    # si uno se cancela, la tarea compartida sigue para los demás.
+
+    def __init__(self):
+        self.calls = {}
+
+    async def do(self, key, factory):
+        future = self.calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self.calls[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(future)
+
+    def _finish(self, key, future):
+        if self.calls.get(key) is future:
+            del self.calls[key]
+        if not future.cancelled():
+            # Marca la excepción como recuperada aunque nadie espere ya
+            future.exception()
+
+    def __len__(self):
+        return len(self.calls)
+
+
+class TrackResolver:
+    # Búsqueda y resolución de canciones pasando siempre por la caché
+
+    def __init__(self, pool, cache, hedge=None):
+        self.pool = pool
+        self.cache = cache
+        # Búsqueda en varias fuentes (sources.HedgedSearch); sin ella solo
+        # se busca en YouTube
+        self.hedge = hedge
+        self.flights = SingleFlight()
+
+    async def search(self, query):
+        # Solo metadatos
+        track = self.cache.lookup(query)
+        if track is not None:
+            return track
+        track = await self.flights.do(('search', normalize_query(query)),
+                                      lambda: self._search(query))
+        if track is not None:
+            self.cache.store(track, query=query)
+        return track
+
+    async def _search(self, query):
+        # Un enlace se extrae tal cual una sola vez: las demás fuentes solo
+        # repetirían la misma extracción (o buscarían la URL como texto)
+        if self.hedge is not None and not is_url(query):
+            return await self._hedged(query)
+        return await self._run(SEARCH_LATENCY, search_track, query)
+
+    async def resolve(self, query, fresh=False):
+        # Metadatos y URL del stream vigente. Con 'fresh' se ignora el stream
+        # de la caché (p. ej. porque la conexión con él se ha caído)
+        known = None
+        video_id = self.cache.video_id(query) or youtube_id(query)
+        if video_id is not None:
+            track = None if fresh else self.cache.track(video_id,
+                                                        need_stream=True)
+            if track is not None:
+                return track
+            # Si ya conocemos el vídeo evitamos repetir la búsqueda
+            known = self.cache.track(video_id)
+        # El prefetcher y un -play del mismo vídeo comparten la extracción
+        if known is None and self.hedge is not None and not is_url(query):
+            track = await self.flights.do(('resolve', normalize_query(query)),
+                                          lambda: self._race(query))
+        else:
+            target = known.webpage_url if known else query
+            track = await self.flights.do(
+                ('resolve', video_id or normalize_query(query)),
+                lambda: self._run(STREAM_LATENCY, resolve_track, target))
+        if track is not None:
+            self.cache.store(track, query=query)
+        return track
+
+    async def _race(self, query):
+        # Extracción directa en YouTube con búsqueda de reserva en el resto
+        # de fuentes; si gana la búsqueda, se resuelve el resultado por URL
+        track, found = await self.hedge.race(
+            query, lambda: self._run(STREAM_LATENCY, resolve_track, query))
+        if found is not None and found.webpage_url:
+            track = await self.flights.do(
+                ('resolve', found.id),
+                lambda: self._run(STREAM_LATENCY, resolve_track,
+                                  found.webpage_url))
+        return track
+
+    async def _run(self, histogram, func, query):
+        with histogram.time():
+            return await self.pool.run(func, query)
+
+    async def _hedged(self, query):
+        with SEARCH_LATENCY.time():
+            return await self.hedge.search(query)
+
+
+def _call_soon_threadsafe(loop, callback):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # El loop ya está cerrado (apagado del bot)
+        pass
@@ -0,0 +1,275 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import functools
+from collections import deque
+from tracks import search_track, SEARCH_TARGETS
+from cache import LRU, normalize_query
+from resolver import ResolverBusy, ResolverTimeout
+
+# Fuentes de búsqueda, en el orden inicial de preferencia
+SEARCH_SOURCES = [
+    name.strip() for name in os.getenv(
+        'SEARCH_SOURCES', 'youtube,youtube_music,soundcloud,spotify').split(',')
+    if name.strip()
+]
+
+# Segundos que se espera a la fuente principal antes de lanzar la siguiente
+# en paralelo: el p90 de sus últimas búsquedas con resultado o, mientras no
+# haya HEDGE_MIN_SAMPLES, HEDGE_DELAY
+HEDGE_DELAY = float(os.getenv('HEDGE_DELAY', '2.0'))
+HEDGE_MIN_SAMPLES = 5
+HEDGE_PERCENTILE = 0.9
+
+# Búsquedas en vuelo por consulta: la principal y como mucho una de reserva.
+# Una búsqueda cancelada sigue ocupando su hilo hasta que yt-dlp termina
+HEDGE_MAX_INFLIGHT = 2
+
+# Una consulta que falla en todas las fuentes SEARCH_MAX_FAILURES veces
+# seguidas no se vuelve a intentar hasta pasado SEARCH_FAILURE_TTL
+SEARCH_MAX_FAILURES = int(os.getenv('SEARCH_MAX_FAILURES', '3'))
+SEARCH_FAILURE_TTL = float(os.getenv('SEARCH_FAILURE_TTL', '600'))
+
+# Fuente que ya cubre la extracción directa de TrackResolver.resolve
+# ('ytsearch1:' con el stream): en la búsqueda de reserva se omite
+DIRECT_SOURCE = 'youtube'
+
+# Peso de la última medida en la media móvil de latencia y medidas que se
+# guardan para el percentil
+LATENCY_SMOOTHING = 0.2
+LATENCY_SAMPLES = 50
+
+
+def spotify_match(spotify, query):
+    # Bloqueante: el nombre y artista que devuelve Spotify suelen dar mejor
+    # resultado en YouTube que la consulta original
+    results = spotify.search(q=query, limit=1)
+    items = results['tracks']['items']
+    if not items:
+        return None
+    track = items[0]
+    return search_track(f"{track['name']} {track['artists'][0]['name']}")
+
+
+class SourceStats:
+    # Solo con datos medidos: una fuente sin búsquedas no tiene latencia
+
+    def __init__(self):
+        self.successes = 0
+        self.failures = 0
+        self.latency = None  # Media móvil de las búsquedas con resultado
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def _smooth(self, elapsed):
+        if self.latency is None:
+            self.latency = elapsed
+        else:
+            self.latency += LATENCY_SMOOTHING * (elapsed - self.latency)
+
+    def record(self, ok, elapsed):
+        if ok:
+            self.successes += 1
+            self.samples.append(elapsed)
+            self._smooth(elapsed)
+        else:
+            self.failures += 1
+
+    def record_loss(self, elapsed):
+        # Cancelada porque otra fuente respondió antes: su latencia real es
+        # al menos 'elapsed'. Una cota no sirve como primera medida
+        if self.latency is not None and elapsed > self.latency:
+            self._smooth(elapsed)
+
+    def percentile(self, q):
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @property
+    def success_rate(self):
+        # Con suavizado de Laplace, para no descartar una fuente por un fallo
+        return (self.successes + 1) / (self.successes + self.failures + 2)
+
+    @property
+    def expected_latency(self):
+        # None sin medidas; infinita si solo ha fallado
+        if self.latency is None:
+            return math.inf if self.failures else None
+        return self.latency / self.success_rate
+
+
+class HedgedSearch:
+    # Lanza la búsqueda en la mejor fuente y, si no responde a tiempo (el
+    # p90 de su latencia) o falla, lanza la siguiente sin cancelar la
+    # anterior, con como mucho una de reserva en vuelo. Gana el primer
+    # resultado y se cancela el resto. El orden se adapta con la latencia y
+    # la tasa de aciertos medidas de cada fuente.
+
+    def __init__(self, pool, sources, delay=HEDGE_DELAY,
+                 max_failures=SEARCH_MAX_FAILURES):
+        self.pool = pool
+        self.sources = sources  # nombre -> función bloqueante(query)
+        self.delay = delay
+        self.max_failures = max_failures
+        self.stats = {name: SourceStats() for name in sources}
+        self.direct = SourceStats()  # Extracciones directas de race()
+        self.failures = LRU(4096)  # consulta -> (fallos seguidos, último)
+
+    def order(self):
+        # Primero las fuentes medidas, de menor a mayor latencia esperada;
+        # después las que aún no se han probado, en el orden configurado, y
+        # al final las que solo han fallado. sorted es estable
+        def rank(name):
+            expected = self.stats[name].expected_latency
+            if expected is None:
+                return (1, 0.0)
+            if expected == math.inf:
+                return (2, 0.0)
+            return (0, expected)
+
+        return sorted(self.sources, key=rank)
+
+    def hedge_delay(self, name):
+        return self._delay(self.stats[name])
+
+    def _delay(self, stats):
+        observed = stats.percentile(HEDGE_PERCENTILE)
+        return self.delay if observed is None else observed
+
+    def _capped(self, key):
+        failed = self.failures.get(key)
+        return (failed is not None and failed[0] >= self.max_failures
+                and time.monotonic() - failed[1] < SEARCH_FAILURE_TTL)
+
+    async def _attempt(self, name, query):
+        start = time.perf_counter()
+        try:
+            track = await self.pool.run(self.sources[name], query)
+        except asyncio.CancelledError:
+            self.stats[name].record_loss(time.perf_counter() - start)
+            raise
+        except ResolverBusy:
+            raise
+        except ResolverTimeout:
+            self.stats[name].record(False, time.perf_counter() - start)
+            raise
+        except Exception as e:
+            logging.error(f"Error al buscar en {name}: {e}")
+            track = None
+        self.stats[name].record(track is not None, time.perf_counter() - start)
+        return track
+
+    async def search(self, query, exclude=()):
+        key = normalize_query(query)
+        if self._capped(key):
+            return None
+        order = [name for name in self.order() if name not in exclude]
+        delay = self.hedge_delay(order[0]) if order else None
+        pending = set()
+        errors = []
+        result = None
+        try:
+            while result is None and (order or pending):
+                if order and len(pending) < HEDGE_MAX_INFLIGHT:
+                    pending.add(
+                        asyncio.ensure_future(
+                            self._attempt(order.pop(0), query)))
+                # Con el cupo lleno solo se lanza otra cuando termine una
+                can_hedge = order and len(pending) < HEDGE_MAX_INFLIGHT
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        errors.append(task.exception())
+                    elif result is None and task.result() is not None:
+                        result = task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+        if result is not None:
+            if self.failures.get(key):
+                self.failures.put(key, (0, time.monotonic()))
+            return result
+        busy = [e for e in errors if isinstance(e, ResolverBusy)]
+        if busy:
+            # No es culpa de las fuentes: no cuenta para el límite
+            raise busy[0]
+        failed = self.failures.get(key)
+        self.failures.put(key, ((failed[0] if failed else 0) + 1,
+                                time.monotonic()))
+        if errors:
+            # Todas las fuentes agotaron el tiempo
+            raise errors[0]
+        return None
+
+    async def race(self, query, primary):
+        # 'primary()' extrae directamente el stream en YouTube. Si no
+        # responde a tiempo (el p90 de sus extracciones), falla o se agota,
+        # se busca a la vez en el resto de fuentes. Devuelve (track, None)
+        # si gana la extracción directa o (None, resultado) si gana la
+        # búsqueda, que hay que resolver por su URL
+        start = time.perf_counter()
+        direct = asyncio.ensure_future(primary())
+        backup = None
+        pending = {direct}
+        errors = []
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if backup else self._delay(self.direct),
+                    return_when=asyncio.FIRST_COMPLETED)
+                if direct in done:
+                    try:
+                        track = direct.result()
+                    except ResolverBusy as e:
+                        errors.append(e)
+                        track = None
+                    except ResolverTimeout as e:
+                        errors.append(e)
+                        track = None
+                        self.direct.record(False, time.perf_counter() - start)
+                    else:
+                        self.direct.record(track is not None,
+                                           time.perf_counter() - start)
+                    if track is not None:
+                        return track, None
+                if backup is not None and backup in done:
+                    try:
+                        found = backup.result()
+                    except (ResolverBusy, ResolverTimeout) as e:
+                        errors.append(e)
+                        found = None
+                    if found is not None:
+                        return None, found
+                if backup is None:
+                    backup = asyncio.ensure_future(
+                        self.search(query, exclude=(DIRECT_SOURCE, )))
+                    pending.add(backup)
+        finally:
+            if not direct.done():
+                direct.cancel()
+                self.direct.record_loss(time.perf_counter() - start)
+            for task in pending:
+                task.cancel()
+        if len(errors) == 2:
+            # Ni la extracción directa ni la búsqueda llegaron a responder
+            raise errors[0]
+        return None, None
+
+
+def build_sources(spotify, names=SEARCH_SOURCES):
+    sources = {}
+    for name in names:
+        if name == 'spotify':
+            sources[name] = functools.partial(spotify_match, spotify)
+        elif name in SEARCH_TARGETS:
+            sources[name] = functools.partial(search_track, source=name)
+        else:
+            logging.warning(f"Fuente de búsqueda desconocida: {name}")
+    return sources
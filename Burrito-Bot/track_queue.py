@@ -0,0 +1,234 @@
+import random
+import itertools
+
+
+class _Node:
+    __slots__ = ('entry_id', 'entry', 'priority', 'size', 'left', 'right',
+                 'parent')
+
+    def __init__(self, entry_id, entry):
+        self.entry_id = entry_id
+        self.entry = entry
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+        self.parent = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+    if node.left:
+        node.left.parent = node
+    if node.right:
+        node.right.parent = node
+    return node
+
+
+def _split(node, index):
+    # Divide en (primeros 'index' elementos, resto)
+    if node is None:
+        return None, None
+    if _size(node.left) < index:
+        left, right = _split(node.right, index - _size(node.left) - 1)
+        node.right = left
+        if right:
+            right.parent = None
+        return _update(node), right
+    left, right = _split(node.left, index)
+    node.left = right
+    if left:
+        left.parent = None
+    return left, _update(node)
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _leftmost(node):
+    while node.left:
+        node = node.left
+    return node
+
+
+def _successor(node):
+    if node.right:
+        return _leftmost(node.right)
+    while node.parent and node.parent.right is node:
+        node = node.parent
+    return node.parent
+
+
+class TrackQueue:
+    # Cola de reproducción sobre un treap implícito: insertar, quitar y mover
+    # por posición cuestan O(log n), y cada entrada tiene un id estable que
+    # no cambia aunque se mueva.
+
+    def __init__(self, entries=()):
+        self.root = None
+        self.nodes = {}
+        self._ids = itertools.count(1)
+        self.extend(entries)
+
+    def __len__(self):
+        return _size(self.root)
+
+    def __bool__(self):
+        return self.root is not None
+
+    def __iter__(self):
+        node = _leftmost(self.root) if self.root else None
+        while node:
+            yield node.entry
+            node = _successor(node)
+
+    def __getitem__(self, index):
+        return self._node_at(index).entry
+
+    def _node_at(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('índice fuera de la cola')
+        node = self.root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node
+            else:
+                index -= left + 1
+                node = node.right
+
+    def _set_root(self, node):
+        self.root = node
+        if node:
+            node.parent = None
+
+    def _new_node(self, entry):
+        node = _Node(next(self._ids), entry)
+        self.nodes[node.entry_id] = node
+        return node
+
+    def append(self, entry):
+        return self.insert(len(self), entry)
+
+    def appendleft(self, entry):
+        return self.insert(0, entry)
+
+    def insert(self, index, entry):
+        index = max(0, min(index, len(self)))
+        node = self._new_node(entry)
+        left, right = _split(self.root, index)
+        self._set_root(_merge(_merge(left, node), right))
+        return node.entry_id
+
+    def extend(self, entries):
+        built = self._build([self._new_node(entry) for entry in entries])
+        self._set_root(_merge(self.root, built))
+
+    def _build(self, nodes):
+        # Árbol equilibrado en O(n); las prioridades se reparten en orden
+        # de anchura para que se cumpla la propiedad de montículo
+        if not nodes:
+            return None
+
+        def build(lo, hi):
+            if lo > hi:
+                return None
+            mid = (lo + hi) // 2
+            node = nodes[mid]
+            node.left = build(lo, mid - 1)
+            node.right = build(mid + 1, hi)
+            node.parent = None
+            return _update(node)
+
+        root = build(0, len(nodes) - 1)
+        priorities = sorted((random.random() for _ in nodes), reverse=True)
+        level = [root]
+        i = 0
+        while level:
+            following = []
+            for node in level:
+                node.priority = priorities[i]
+                i += 1
+                following.extend(c for c in (node.left, node.right) if c)
+            level = following
+        return root
+
+    def pop(self, index=0):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('índice fuera de la cola')
+        left, right = _split(self.root, index)
+        node, right = _split(right, 1)
+        self._set_root(_merge(left, right))
+        del self.nodes[node.entry_id]
+        return node.entry
+
+    def popleft(self):
+        return self.pop(0)
+
+    def __delitem__(self, index):
+        self.pop(index)
+
+    def index_of(self, entry_id):
+        node = self.nodes[entry_id]
+        index = _size(node.left)
+        while node.parent:
+            if node.parent.right is node:
+                index += _size(node.parent.left) + 1
+            node = node.parent
+        return index
+
+    def remove_id(self, entry_id):
+        return self.pop(self.index_of(entry_id))
+
+    def id_at(self, index):
+        return self._node_at(index).entry_id
+
+    def move(self, from_index, to_index):
+        entry_id = self.id_at(from_index)
+        entry = self.pop(from_index)
+        index = max(0, min(to_index, len(self)))
+        # Se conserva el id de la entrada movida
+        node = _Node(entry_id, entry)
+        self.nodes[entry_id] = node
+        left, right = _split(self.root, index)
+        self._set_root(_merge(_merge(left, node), right))
+        return entry
+
+    def page(self, start, count):
+        # Solo recorre las entradas visibles: O(log n + count)
+        if start >= len(self) or count <= 0:
+            return []
+        node = self._node_at(start)
+        items = []
+        while node and len(items) < count:
+            items.append((node.entry_id, node.entry))
+            node = _successor(node)
+        return items
+
+    def shuffle(self):
+        nodes = list(self.nodes.values())
+        random.shuffle(nodes)
+        self._set_root(self._build(nodes))
+
+    def clear(self):
+        self.root = None
+        self.nodes.clear()
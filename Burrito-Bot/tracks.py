@@ -0,0 +1,217 @@
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from urllib.parse import urlparse, parse_qs, quote_plus
+import yt_dlp as youtube_dl
+
+# Perfil ligero para búsquedas: solo metadatos, sin resolver formatos. Un
+# enlace watch?v=...&list=... es solo ese vídeo, no la playlist
+SEARCH_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'extract_flat': 'in_playlist',
+    'noplaylist': True,
+}
+
+# Como el de búsqueda, pero expandiendo la lista: el Mix del autoplay
+MIX_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'extract_flat': 'in_playlist',
+}
+
+# Perfil para streaming: resuelve el mejor formato de audio, sin
+# postprocesadores (nunca descargamos nada)
+STREAM_OPTS = {
+    'format': 'bestaudio/best',
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'noplaylist': True,
+}
+
+PROFILES = {'search': SEARCH_OPTS, 'stream': STREAM_OPTS, 'mix': MIX_OPTS}
+
+# Cada hilo reutiliza sus instancias de YoutubeDL (no son thread-safe) y las
+# recicla tras cierto número de usos o de segundos para acotar la memoria
+YDL_MAX_USES = int(os.getenv('YDL_MAX_USES', '200'))
+YDL_MAX_AGE = float(os.getenv('YDL_MAX_AGE', '1800'))
+
+# Extractores que se inicializan por adelantado
+WARM_EXTRACTORS = ('Youtube', 'YoutubeSearch', 'YoutubeTab')
+
+_local = threading.local()
+
+# Margen para no empezar a reproducir una URL a punto de caducar
+EXPIRY_MARGIN = 60
+
+# Búsqueda de un único resultado en cada fuente que entiende yt-dlp
+SEARCH_TARGETS = {
+    'youtube': lambda query: f"ytsearch1:{query}",
+    'youtube_music': lambda query:
+    f"https://music.youtube.com/search?q={quote_plus(query)}#songs",
+    'soundcloud': lambda query: f"scsearch1:{query}",
+}
+
+
+@dataclass
+class Track:
+    id: str
+    title: str
+    webpage_url: str
+    stream_url: str = None
+    codec: str = None
+    bitrate: float = None
+    duration: int = None
+    thumbnail: str = None
+    expires_at: float = None
+
+    @property
+    def expired(self):
+        if not self.stream_url:
+            return True
+        if self.expires_at is None:
+            return False
+        return time.time() + EXPIRY_MARGIN >= self.expires_at
+
+    @classmethod
+    def from_entry(cls, entry):
+        return cls(id=entry.get('id'),
+                   title=entry['title'],
+                   webpage_url=entry.get('url'),
+                   duration=entry.get('duration'),
+                   thumbnail=entry.get('thumbnail'))
+
+    def to_entry(self, query=None):
+        return {
+            'query': query or self.title,
+            'id': self.id,
+            'title': self.title,
+            'url': self.webpage_url,
+            'thumbnail': self.thumbnail,
+            'duration': self.duration,
+        }
+
+
+def is_url(query):
+    return query.startswith(('http://', 'https://'))
+
+
+def youtube_id(url):
+    # Id de vídeo de un enlace watch?v=... o youtu.be/..., si lo es
+    if not is_url(url):
+        return None
+    parsed = urlparse(url)
+    if parsed.netloc.endswith('youtu.be'):
+        return parsed.path.lstrip('/') or None
+    if parsed.netloc.endswith('youtube.com'):
+        return (parse_qs(parsed.query).get('v') or [None])[0]
+    return None
+
+
+def stream_expiry(stream_url):
+    # Las URLs de googlevideo llevan el timestamp de caducidad en 'expire'
+    try:
+        return float(parse_qs(urlparse(stream_url).query)['expire'][0])
+    except (KeyError, IndexError, ValueError):
+        return None
+
+
+class _PooledYDL:
+
+    def __init__(self, profile):
+        self.ydl = youtube_dl.YoutubeDL(PROFILES[profile])
+        self.created = time.monotonic()
+        self.uses = 0
+
+    @property
+    def worn_out(self):
+        return (self.uses >= YDL_MAX_USES
+                or time.monotonic() - self.created >= YDL_MAX_AGE)
+
+
+def get_ydl(profile):
+    # Instancia de larga duración del hilo actual para el perfil pedido
+    pool = getattr(_local, 'pool', None)
+    if pool is None:
+        pool = _local.pool = {}
+    pooled = pool.get(profile)
+    if pooled is None or pooled.worn_out:
+        if pooled is not None:
+            pooled.ydl.close()
+        pooled = pool[profile] = _PooledYDL(profile)
+    pooled.uses += 1
+    return pooled.ydl
+
+
+def warm_up():
+    # Crea las instancias del hilo actual y carga los extractores de YouTube
+    for profile in PROFILES:
+        ydl = get_ydl(profile)
+        for ie_key in WARM_EXTRACTORS:
+            ydl.get_info_extractor(ie_key)
+
+
+def _thumbnail(info):
+    if info.get('thumbnail'):
+        return info['thumbnail']
+    thumbnails = info.get('thumbnails') or []
+    return thumbnails[-1]['url'] if thumbnails else None
+
+
+def _first_entry(info):
+    if info and 'entries' in info:
+        # Las entradas pueden llegar como generador (process=False)
+        return next(iter(info['entries'] or []), None)
+    return info
+
+
+def track_from_info(info, with_stream=True):
+    stream_url = info.get('url') if with_stream and info.get('acodec') else None
+    duration = info.get('duration')
+    return Track(
+        id=info['id'],
+        title=info.get('title') or info['id'],
+        webpage_url=info.get('webpage_url') or info.get('url'),
+        stream_url=stream_url,
+        codec=info.get('acodec') if stream_url else None,
+        bitrate=info.get('abr') if stream_url else None,
+        duration=int(duration) if duration else None,
+        thumbnail=_thumbnail(info),
+        expires_at=stream_expiry(stream_url) if stream_url else None,
+    )
+
+
+def search_track(query, source='youtube'):
+    # Búsqueda plana: título, URL e id sin extraer el stream
+    ydl = get_ydl('search')
+    try:
+        if is_url(query):
+            target, lazy = query, False
+        else:
+            target = SEARCH_TARGETS[source](query)
+            # La búsqueda de YouTube Music pagina sin límite: sin procesar
+            # solo se pide la primera página
+            lazy = source == 'youtube_music'
+        entry = _first_entry(
+            ydl.extract_info(target, download=False, process=not lazy))
+        return track_from_info(entry, with_stream=False) if entry else None
+    except Exception as e:
+        logging.error(f"Error al buscar en {source}: {e}")
+        return None
+
+
+def resolve_track(query):
+    # Una sola extracción completa: metadatos y URL directa del stream
+    ydl = get_ydl('stream')
+    try:
+        target = query if is_url(query) else f"ytsearch1:{query}"
+        entry = _first_entry(ydl.extract_info(target, download=False))
+        return track_from_info(entry) if entry else None
+    except Exception as e:
+        logging.error(f"Error al resolver la canción: {e}")
+        return None